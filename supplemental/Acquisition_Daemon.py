@@ -0,0 +1,465 @@
+import argparse
+import json
+import os
+import select
+import socket
+import sys
+import threading
+import time
+
+import serial
+
+# One process owns every serial device on the extrusion line and publishes
+# what they send, timestamped and parsed, over a Unix socket. The thickness
+# monitor (--bus) and the pellet dispenser GUI (port "bus") subscribe, so a
+# slow redraw in either never holds up acquisition, and any number of
+# viewers can attach without reopening the ports:
+#
+#   python Acquisition_Daemon.py --dispenser /dev/tty.usbmodem1101 --gauge /dev/tty.usbserial-1410
+#   python Appendix_D_Felfil_Thickness_Gui.py --bus
+#   python Appendix_C_Pellet_Dispenser_Gui.py      (pick "bus" as the port)
+#
+# The wire format is one JSON object per line. Subscribers send
+#   {"op": "subscribe", "topics": ["thickness"], "devices": ["usbserial-1410"]}
+#   {"op": "send", "device": "usbmodem1101", "line": "start"}
+# and receive, after a {"topic": "devices", "devices": {name: topic}} hello,
+#   {"topic": "thickness", "device": ..., "t": ..., "times": [...], "values": [...]}
+#   {"topic": "dispenser", "device": ..., "t": ..., "line": ..., "kind": ..., "value": ...}
+# where `t` is the time.monotonic() the bytes arrived at the daemon (the
+# clock is system-wide, so subscribers can measure latency against it)
+# and kind/value are parse_response()'s ArduinoEvent, or null.
+
+BUS_SOCKET = "/tmp/extrusion_bus.sock"
+
+# A subscriber that falls this far behind loses events (counted) rather
+# than ever making the readers wait
+MAX_SUBSCRIBER_BUFFER = 8 * 1024 * 1024  # bytes
+
+# The latest dispenser event of these kinds is replayed to new subscribers,
+# so a GUI that attaches later still sees the banner and current state
+RETAINED_KINDS = ("ready", "state", "status")
+
+
+def encode(message):
+    return (json.dumps(message, separators=(",", ":")) + "\n").encode()
+
+
+# --- Subscriber side ---
+class BusClient:
+    """Connection to the daemon; a reader thread passes each event to `on_event`
+
+    The hello's device map is read before the constructor returns and
+    kept in `devices` ({name: topic}).
+    """
+
+    def __init__(self, path=BUS_SOCKET, topics=("thickness", "dispenser"), devices=None, on_event=None,
+                 timeout=2.0):
+        self.on_event = on_event
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(timeout)
+        self.sock.connect(path)
+        self.sock.sendall(encode({"op": "subscribe", "topics": list(topics),
+                                  "devices": list(devices) if devices else None}))
+        self._file = self.sock.makefile("rb")
+        hello = json.loads(self._file.readline() or b"{}")
+        self.devices = hello.get("devices", {})
+        self.sock.settimeout(None)
+        self._send_lock = threading.Lock()
+        self._thread = None
+        self.closed = False
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        try:
+            for raw_line in self._file:
+                self.on_event(json.loads(raw_line))
+        except (OSError, ValueError):
+            pass
+        if not self.closed:
+            self.closed = True
+            self.on_event(None)  # the daemon went away
+
+    def send(self, device, line):
+        with self._send_lock:
+            self.sock.sendall(encode({"op": "send", "device": device, "line": line}))
+
+    def close(self):
+        self.closed = True
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.sock.close()
+        if self._thread:
+            self._thread.join(timeout=2)
+
+
+def bus_available(path=BUS_SOCKET):
+    return os.path.exists(path)
+
+
+class BusPort:
+    """Serial-port stand-in for a dispenser on the bus
+
+    read() returns the dispenser's lines as they arrived at the daemon and
+    write() sends command lines to it, so PelletDispenserGUI's reader
+    thread and CommandWriter work on it unchanged. `device` defaults to
+    the first dispenser the daemon has.
+    """
+
+    def __init__(self, path=BUS_SOCKET, device=None, timeout=1):
+        self.timeout = timeout
+        self._buffer = bytearray()
+        self._condition = threading.Condition()
+        self.client = BusClient(path, topics=("dispenser",), devices=[device] if device else None,
+                                on_event=self._on_event)
+        if device is None:
+            device = next((name for name, topic in self.client.devices.items() if topic == "dispenser"), None)
+        if self.client.devices.get(device) != "dispenser":
+            self.client.close()
+            raise OSError(f"no dispenser {device} on the acquisition bus" if device
+                          else "no dispenser on the acquisition bus")
+        self.device = device
+        self.is_open = True
+        self.client.start()
+
+    def _on_event(self, event):
+        with self._condition:
+            if event is None:
+                self.is_open = False
+            else:
+                self._buffer += (event["line"] + "\n").encode()
+            self._condition.notify()
+
+    @property
+    def in_waiting(self):
+        return len(self._buffer)
+
+    def read(self, size=1):
+        with self._condition:
+            if not self._buffer and self.is_open:
+                self._condition.wait(self.timeout)
+            if not self._buffer and not self.is_open:
+                raise OSError("acquisition daemon closed the connection")
+            data = bytes(self._buffer[:size])
+            del self._buffer[:size]
+            return data
+
+    def write(self, data):
+        for line in data.decode().splitlines():
+            self.client.send(self.device, line)
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.is_open = False
+        self.client.close()
+        with self._condition:
+            self._condition.notify()
+
+
+# --- Devices ---
+class SerialDevice:
+    """Reader thread for one serial device, publishing parsed events to the daemon
+
+    Gauge bytes go through a BatchParser; dispenser bytes are split into
+    lines and each one is parsed with parse_response().
+    """
+
+    def __init__(self, daemon, name, topic, port, baudrate=9600):
+        self.daemon = daemon
+        self.name = name
+        self.topic = topic
+        self.port = port
+        self.ser = serial.Serial(port, baudrate, timeout=1)
+        self.ser.reset_input_buffer()
+        self.write_lock = threading.Lock()
+        self.running = False
+        self.thread = None
+        self.error = None
+
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.running = False
+        if self.thread:
+            self.thread.join(timeout=2)
+        self.ser.close()
+
+    def write(self, line):
+        with self.write_lock:
+            self.ser.write(f"{line}\n".encode())
+            self.ser.flush()
+
+    def run(self):
+        if self.topic == "thickness":
+            from Appendix_D_Felfil_Thickness_Gui import BatchParser
+            parser = BatchParser()
+            synced = False  # the port may have opened mid-line
+        else:
+            from Appendix_C_Pellet_Dispenser_Gui import parse_response
+            buffer = bytearray()
+
+        while self.running:
+            try:
+                data = self.ser.read(max(1, self.ser.in_waiting))
+            except Exception as e:
+                self.error = e
+                print(f"{self.name}: read error: {e}", file=sys.stderr)
+                break
+            if not data:
+                continue
+            arrival = time.monotonic()
+
+            if self.topic == "thickness":
+                if not synced:
+                    cut = data.find(b"\n") + 1
+                    if not cut:
+                        continue
+                    data = data[cut:]
+                    synced = True
+                times, values, _ = parser.feed(data)
+                if len(times):
+                    self.daemon.publish({"topic": "thickness", "device": self.name, "t": arrival,
+                                         "times": times.tolist(), "values": values.tolist()})
+                continue
+
+            buffer += data
+            start = 0
+            end = buffer.find(b"\n")
+            while end >= 0:
+                line = buffer[start:end].strip().decode("utf-8", errors="ignore")
+                if line:
+                    event = parse_response(line)
+                    self.daemon.publish({"topic": "dispenser", "device": self.name, "t": arrival, "line": line,
+                                         "kind": event.kind if event else None,
+                                         "value": event.value if event else None})
+                start = end + 1
+                end = buffer.find(b"\n", start)
+            del buffer[:start]
+
+
+# --- Daemon ---
+class Subscriber:
+    def __init__(self, sock):
+        self.sock = sock
+        self.topics = None  # nothing is sent before the subscribe message
+        self.devices = None
+        self.inbuf = bytearray()
+        self.outbuf = bytearray()
+        self.dropped = 0
+
+    def wants(self, message):
+        return (self.topics is not None and message["topic"] in self.topics
+                and (self.devices is None or message["device"] in self.devices))
+
+
+class AcquisitionDaemon:
+    """Fans device events out to subscribers over a Unix socket
+
+    Reader threads call publish(), which only appends to each subscriber's
+    buffer; the main thread's select loop does all socket I/O.
+    """
+
+    def __init__(self, path=BUS_SOCKET, max_buffer=MAX_SUBSCRIBER_BUFFER):
+        self.path = path
+        self.max_buffer = max_buffer
+        self.devices = {}
+        self.subscribers = {}
+        self.retained = {}  # (device, kind) -> encoded event, oldest first
+        self.lock = threading.Lock()
+        self.published = 0
+        self._wake_r, self._wake_w = socket.socketpair()
+        self._wake_r.setblocking(False)
+        self._wake_w.setblocking(False)
+        self._woken = False
+        self._stop = threading.Event()
+
+    def add_device(self, name, topic, port):
+        device = SerialDevice(self, name, topic, port)
+        self.devices[name] = device
+        device.start()
+        return device
+
+    def publish(self, message):
+        data = encode(message)
+        with self.lock:
+            self.published += 1
+            if message.get("kind") in RETAINED_KINDS:
+                key = (message["device"], message["kind"])
+                self.retained.pop(key, None)  # re-insert so replay stays in arrival order
+                self.retained[key] = (message, data)
+            for subscriber in self.subscribers.values():
+                if not subscriber.wants(message):
+                    continue
+                if len(subscriber.outbuf) + len(data) > self.max_buffer:
+                    subscriber.dropped += 1
+                    continue
+                subscriber.outbuf += data
+            if self._woken:
+                return
+            self._woken = True
+        try:
+            self._wake_w.send(b"\0")
+        except BlockingIOError:
+            pass
+
+    def stop(self):
+        """Make serve() return (from another thread)"""
+        self._stop.set()
+        try:
+            self._wake_w.send(b"\0")
+        except BlockingIOError:
+            pass
+
+    def _accept(self, listener):
+        sock, _ = listener.accept()
+        sock.setblocking(False)
+        with self.lock:
+            self.subscribers[sock] = Subscriber(sock)
+
+    def _drop(self, subscriber):
+        with self.lock:
+            del self.subscribers[subscriber.sock]
+        if subscriber.dropped:
+            print(f"Subscriber left, {subscriber.dropped} events dropped while it lagged", file=sys.stderr)
+        subscriber.sock.close()
+
+    def _handle(self, subscriber, request):
+        if request.get("op") == "subscribe":
+            hello = {"topic": "devices", "devices": {name: device.topic for name, device in self.devices.items()}}
+            with self.lock:
+                subscriber.topics = set(request.get("topics") or ())
+                subscriber.devices = set(request["devices"]) if request.get("devices") else None
+                subscriber.outbuf += encode(hello)
+                for message, data in self.retained.values():
+                    if subscriber.wants(message):
+                        subscriber.outbuf += data
+        elif request.get("op") == "send":
+            device = self.devices.get(request.get("device"))
+            if device is None or device.topic != "dispenser":
+                return
+            try:
+                device.write(request["line"])
+            except Exception as e:
+                print(f"{device.name}: write error: {e}", file=sys.stderr)
+
+    def _read(self, subscriber):
+        try:
+            data = subscriber.sock.recv(65536)
+        except BlockingIOError:
+            return
+        except OSError:
+            data = b""
+        if not data:
+            self._drop(subscriber)
+            return
+        subscriber.inbuf += data
+        while b"\n" in subscriber.inbuf:
+            raw_line, _, rest = bytes(subscriber.inbuf).partition(b"\n")
+            subscriber.inbuf[:] = rest
+            try:
+                self._handle(subscriber, json.loads(raw_line))
+            except (ValueError, AttributeError, KeyError):
+                pass  # ignore malformed requests
+
+    def _write(self, subscriber):
+        with self.lock:
+            data = bytes(subscriber.outbuf[:262144])
+        try:
+            sent = subscriber.sock.send(data)
+        except BlockingIOError:
+            return
+        except OSError:
+            self._drop(subscriber)
+            return
+        with self.lock:
+            del subscriber.outbuf[:sent]
+
+    def serve(self):
+        """Accept subscribers and move data until Ctrl-C or stop()"""
+        if os.path.exists(self.path):
+            os.remove(self.path)  # left behind by a daemon that didn't exit cleanly
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        listener.bind(self.path)
+        listener.listen()
+        listener.setblocking(False)
+        try:
+            while not self._stop.is_set():
+                with self.lock:
+                    self._woken = False
+                    subscribers = list(self.subscribers.values())
+                    writers = [s.sock for s in subscribers if s.outbuf]
+                readers = [listener, self._wake_r] + [s.sock for s in subscribers]
+                readable, writable, _ = select.select(readers, writers, [], 1.0)
+                for sock in readable:
+                    if sock is listener:
+                        self._accept(listener)
+                    elif sock is self._wake_r:
+                        try:
+                            self._wake_r.recv(4096)
+                        except BlockingIOError:
+                            pass
+                    elif sock in self.subscribers:
+                        self._read(self.subscribers[sock])
+                for sock in writable:
+                    if sock in self.subscribers:
+                        self._write(self.subscribers[sock])
+        except KeyboardInterrupt:
+            pass
+        finally:
+            listener.close()
+            os.remove(self.path)
+            for subscriber in list(self.subscribers.values()):
+                subscriber.sock.close()
+            for device in self.devices.values():
+                device.stop()
+
+
+def main():
+    from Appendix_D_Felfil_Thickness_Gui import find_serial_ports, gauge_name
+
+    parser = argparse.ArgumentParser(description="Serial acquisition daemon for the extrusion line")
+    parser.add_argument("--socket", default=BUS_SOCKET, help=f"Unix socket to serve (default: {BUS_SOCKET})")
+    parser.add_argument("--gauge", action="append", default=[], metavar="PORT",
+                        help="Thickness gauge serial port; repeat for several gauges")
+    parser.add_argument("--all-gauges", action="store_true",
+                        help="Read every detected /dev/tty.usbserial-*/usbmodem* port as a gauge")
+    parser.add_argument("--dispenser", action="append", default=[], metavar="PORT",
+                        help="Pellet dispenser Arduino serial port")
+    args = parser.parse_args()
+
+    gauges = list(args.gauge)
+    if args.all_gauges:
+        gauges += [port for port in find_serial_ports() if port not in gauges + args.dispenser]
+    if not gauges and not args.dispenser:
+        parser.error("give at least one --gauge or --dispenser")
+
+    daemon = AcquisitionDaemon(args.socket)
+    for topic, ports in (("thickness", gauges), ("dispenser", args.dispenser)):
+        for port in ports:
+            name = gauge_name(port)
+            try:
+                daemon.add_device(name, topic, port)
+            except Exception as e:
+                print(f"Failed to open {port}: {e}", file=sys.stderr)
+                continue
+            print(f"→ {topic} {name}: {port}")
+    if not daemon.devices:
+        sys.exit(1)
+
+    print(f"Publishing on {args.socket}, press Ctrl-C to stop")
+    daemon.serve()
+    print(f"{daemon.published} events published")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,365 @@
 import tkinter as tk
 from tkinter import ttk, messagebox, scrolledtext
 import serial
+import os
 import threading
 import time
 from datetime import datetime
+from collections import deque, namedtuple
 import math
+import re
+from bisect import bisect_left
+
+# Arduino lines are handed to the Tk thread in batches: at most one batch
+# every DISPATCH_TICK_MS, of up to DISPATCH_BATCH lines
+DISPATCH_TICK_MS = 50
+DISPATCH_BATCH = 200
+
+# Commands get this long to be answered before they're reported as lost
+COMMAND_TIMEOUT = 2.0
+
+# After opening the port, wait this long for the "Pellet dispenser ready"
+# banner; boards that don't reset on connect never send it
+READY_TIMEOUT = 3.0
+
+# Seconds between background scans for plugged/unplugged serial ports
+PORT_SCAN_INTERVAL = 2.0
+
+# --- Arduino protocol ---
+# One event per recognised firmware line. `value` depends on `kind`:
+#   ready    None                      "Pellet dispenser ready"
+#   state    True/False (running)      "System started" / "System stopped"
+#   status   dict of the status line   "Running:Y Refill:N Cal:12.50 ..."
+#   refill   None                      "Refill needed"
+#   pour     grams, or None if unknown "Poured: 5.0g", "Pour complete"
+#   weight   grams left in the hopper  "Current weight: 85.0g", "Remaining: 80.2g"
+#   setting  (name, number)            "Cal weight: 12.50", "Time: 30", "Hopper: 100.00g, ..."
+#   timing   seconds                   "Next pour in: 12"
+ArduinoEvent = namedtuple("ArduinoEvent", "kind value")
+
+_NUMBER = r"\s*(-?\d+(?:\.\d*)?)"
+
+def _status(running, refill, cal, pour, interval, hopper):
+    status = {"running": running in "Yy", "refill": refill in "Yy"}
+    if cal is not None:
+        status.update(cal=float(cal), pour=float(pour), time=float(interval), hopper=float(hopper))
+    return status
+
+# (kind, pattern, convert) in priority order; `convert` gets the pattern's
+# groups. All patterns are joined into one regex anchored at the start of
+# the line (the firmware always leads with the keyword), so a line is
+# scanned once and "Pour weight: 5" or "Cal weight: 12" can no longer be
+# mistaken for a hopper "weight:" reading.
+RESPONSE_TABLE = [
+    ("ready", r"Pellet dispenser ready", None),
+    ("state", r"System (started|stopped)", lambda word: word.lower() == "started"),
+    ("status", r"Running:([YN]) Refill:([YN])(?: Cal:" + _NUMBER + " Pour:" + _NUMBER
+        + " Time:" + _NUMBER + " Hopper:" + _NUMBER + ")?", _status),
+    ("refill", r"Refill (?:needed|required)", None),
+    ("pour", r"(?:Poured|Dispensed):" + _NUMBER, float),
+    ("pour", r"Pour complete|Manual pour", None),
+    ("setting", r"(Cal weight|Pour weight|Time|Hopper):" + _NUMBER, lambda name, value: (name.split()[0].lower(), float(value))),
+    ("weight", r"(?:Current weight|Weight|Remaining):" + _NUMBER, float),
+    ("timing", r"(?:Next pour in|Time remaining|Countdown):?" + _NUMBER, float),
+]
+
+def _compile_table(table):
+    """One alternation with an outer group per entry
+
+    Returns the regex and {outer group number: (kind, convert, inner group numbers)}.
+    """
+    alternatives = []
+    entries = {}
+    group = 1
+    for kind, pattern, convert in table:
+        alternatives.append(f"({pattern})")
+        inner = re.compile(pattern).groups
+        entries[group] = (kind, convert, tuple(range(group + 1, group + inner + 1)))
+        group += inner + 1
+    return re.compile("|".join(alternatives), re.IGNORECASE), entries
+
+_RESPONSE_RE, _RESPONSE_ENTRIES = _compile_table(RESPONSE_TABLE)
+
+def parse_response(line):
+    """ArduinoEvent for one firmware line, or None if it isn't one we act on"""
+    match = _RESPONSE_RE.match(line)
+    if match is None:
+        return None
+    # The outer group closes last, so lastindex identifies the entry
+    kind, convert, groups = _RESPONSE_ENTRIES[match.lastindex]
+    if convert is None:
+        return ArduinoEvent(kind, None)
+    if len(groups) == 1:
+        return ArduinoEvent(kind, convert(match.group(groups[0])))
+    return ArduinoEvent(kind, convert(*match.group(*groups)))
+
+class SerialConsole:
+    """Serial output pane: a bounded Text widget in front of a rotating log file
+
+    Messages are buffered and written to the widget and the file once per
+    `tick_ms`, and the widget only keeps the last `max_lines` lines. The
+    full timestamped history goes to `log_path`, rotated to .1, .2, ...
+    at `max_bytes`; search() reads it back from there.
+    """
+
+    def __init__(self, parent, root, log_path="serial_output.log", max_lines=1000,
+                 max_bytes=5_000_000, backups=5, tick_ms=100):
+        self.root = root
+        self.log_path = log_path
+        self.max_lines = max_lines
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.tick_ms = tick_ms
+        self.pending = []
+        self.flush_scheduled = False
+        self.file = open(log_path, "a", encoding="utf-8")
+        
+        self.text = scrolledtext.ScrolledText(parent, height=12, width=80)
+        self.text.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
+        
+        button_frame = ttk.Frame(parent)
+        button_frame.grid(row=1, column=0, sticky=(tk.W, tk.E), pady=(5, 0))
+        ttk.Button(button_frame, text="Clear Output", command=self.clear).pack(side=tk.LEFT)
+        
+        # Search the on-disk history
+        self.search_var = tk.StringVar()
+        ttk.Button(button_frame, text="Search Log", command=self.show_search).pack(side=tk.RIGHT)
+        search_entry = ttk.Entry(button_frame, textvariable=self.search_var, width=25)
+        search_entry.pack(side=tk.RIGHT, padx=(0, 5))
+        search_entry.bind("<Return>", lambda event: self.show_search())
+        
+        parent.columnconfigure(0, weight=1)
+        parent.rowconfigure(0, weight=1)
+    
+    def write(self, message):
+        now = datetime.now()
+        self.pending.append((now, message))
+        if not self.flush_scheduled:
+            self.flush_scheduled = True
+            self.root.after(self.tick_ms, self.flush)
+    
+    def flush(self):
+        """Write everything pending to the file and the widget in one go"""
+        self.flush_scheduled = False
+        if not self.pending:
+            return
+        pending, self.pending = self.pending, []
+        
+        self.file.write("".join(f"{now.isoformat(sep=' ', timespec='milliseconds')} {message}\n"
+                                for now, message in pending))
+        self.file.flush()
+        if self.file.tell() >= self.max_bytes:
+            self.rotate()
+        
+        self.text.insert(tk.END, "".join(f"[{now.strftime('%H:%M:%S')}] {message}\n"
+                                         for now, message in pending))
+        lines = int(self.text.index("end-1c").split(".")[0]) - 1
+        if lines > self.max_lines:
+            self.text.delete("1.0", f"{lines - self.max_lines + 1}.0")
+        self.text.see(tk.END)
+    
+    def rotate(self):
+        self.file.close()
+        for i in range(self.backups - 1, 0, -1):
+            if os.path.exists(f"{self.log_path}.{i}"):
+                os.replace(f"{self.log_path}.{i}", f"{self.log_path}.{i + 1}")
+        os.replace(self.log_path, f"{self.log_path}.1")
+        self.file = open(self.log_path, "a", encoding="utf-8")
+    
+    def clear(self):
+        """Clear the widget; the log file keeps the history"""
+        self.text.delete(1.0, tk.END)
+    
+    def search(self, pattern, limit=5000):
+        """The last `limit` logged lines containing `pattern` (case-insensitive), oldest first"""
+        self.flush()
+        pattern = pattern.lower()
+        matches = deque(maxlen=limit)
+        paths = [f"{self.log_path}.{i}" for i in range(self.backups, 0, -1)] + [self.log_path]
+        for path in paths:
+            if not os.path.exists(path):
+                continue
+            with open(path, encoding="utf-8", errors="replace") as f:
+                for line in f:
+                    if pattern in line.lower():
+                        matches.append(line)
+        return list(matches)
+    
+    def show_search(self):
+        pattern = self.search_var.get().strip()
+        if not pattern:
+            return
+        matches = self.search(pattern)
+        
+        window = tk.Toplevel(self.root)
+        window.title(f"Log matches for '{pattern}' ({len(matches)})")
+        results = scrolledtext.ScrolledText(window, height=25, width=100)
+        results.pack(fill=tk.BOTH, expand=True)
+        results.insert(tk.END, "".join(matches) if matches else "No matches\n")
+        results.see(tk.END)
+        results.config(state="disabled")
+    
+    def close(self):
+        self.flush()
+        self.file.close()
+
+# --- Command writer ---
+# The reply that acknowledges each firmware command (any of these prefixes);
+# "Unknown command" answers the oldest command still waiting
+COMMAND_REPLIES = {
+    "cal": ("Cal weight:",),
+    "pour": ("Pour weight:",),
+    "time": ("Time:",),
+    "hopper": ("Hopper:",),
+    "start": ("System started", "Set all parameters first"),
+    "stop": ("System stopped",),
+    "alarm_on": ("Alarm on",),
+    "alarm_off": ("Alarm off",),
+    "status": ("Running:",),
+    "manual": ("Pouring pellets", "Set cal and pour weight first"),
+    "calibrate": ("Calibrating...",),
+    "help": ("Commands:",),
+}
+PARAMETER_COMMANDS = ("cal", "pour", "time", "hopper")
+
+class CommandWriter:
+    """One thread that writes commands to the Arduino in order and tracks their replies
+
+    send() queues a command; a parameter set such as "pour 5" replaces one
+    for the same parameter that hasn't been written yet. Written commands
+    wait for their reply: match_reply() pairs an incoming line with the
+    oldest command it answers and returns the round trip time, and commands
+    still unanswered after `timeout` seconds go to `on_timeout`. The
+    callbacks run on the writer thread.
+    """
+
+    def __init__(self, serial_port, on_sent=None, on_timeout=None, on_error=None, timeout=COMMAND_TIMEOUT):
+        self.serial_port = serial_port
+        self.on_sent = on_sent
+        self.on_timeout = on_timeout
+        self.on_error = on_error
+        self.timeout = timeout
+        self.pending = deque()
+        self.awaiting = []  # (command, monotonic time written), oldest first
+        self.condition = threading.Condition()
+        self.running = False
+        self.thread = None
+        self.coalesced = 0
+    
+    def start(self):
+        self.running = True
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+    
+    def stop(self):
+        with self.condition:
+            self.running = False
+            self.condition.notify()
+        if self.thread:
+            self.thread.join(timeout=2)
+    
+    def send(self, command):
+        name = command.split(" ", 1)[0]
+        with self.condition:
+            if name in PARAMETER_COMMANDS:
+                for i, queued in enumerate(self.pending):
+                    if queued.split(" ", 1)[0] == name:
+                        self.pending[i] = command
+                        self.coalesced += 1
+                        return
+            self.pending.append(command)
+            self.condition.notify()
+    
+    def run(self):
+        while True:
+            with self.condition:
+                while True:
+                    expired, wait = self.expire()
+                    if expired or self.pending or not self.running:
+                        break
+                    self.condition.wait(wait)
+                running = self.running
+                command = self.pending.popleft() if running and self.pending else None
+            
+            # Callbacks run outside the lock: on_timeout may wait on the Tk
+            # thread, which takes the lock in match_reply()
+            if self.on_timeout:
+                for expired_command in expired:
+                    self.on_timeout(expired_command)
+            if not running:
+                return
+            if command is None:
+                continue
+            
+            try:
+                self.serial_port.write(f"{command}\n".encode())
+                self.serial_port.flush()  # Ensure data is sent immediately
+            except Exception as e:
+                if self.on_error:
+                    self.on_error(command, e)
+                continue
+            with self.condition:
+                self.awaiting.append((command, time.monotonic()))
+            if self.on_sent:
+                self.on_sent(command)
+    
+    def expire(self):
+        """Drop commands past their timeout (call with the lock held)
+
+        Returns (expired commands, seconds until the next one is due or
+        None if none are waiting).
+        """
+        now = time.monotonic()
+        expired = []
+        while self.awaiting and now - self.awaiting[0][1] >= self.timeout:
+            expired.append(self.awaiting.pop(0)[0])
+        if not self.awaiting:
+            return expired, None
+        return expired, self.awaiting[0][1] + self.timeout - now
+    
+    def match_reply(self, line, arrival):
+        """(command, round trip seconds) if `line` answers a waiting command, else None"""
+        unknown = line.startswith("Unknown command")
+        with self.condition:
+            for i, (command, sent) in enumerate(self.awaiting):
+                if unknown or line.startswith(COMMAND_REPLIES.get(command.split(" ", 1)[0], ())):
+                    del self.awaiting[i]
+                    return command, arrival - sent
+        return None
+
+# --- Dispenser state ---
+class DispenserState:
+    """Observable dispenser state; widgets subscribe and redraw only when their fields change
+
+    Fields: running, refill (bools), hopper_weight, hopper_max (grams),
+    cal_weight, pour_weight, time_between, hopper_capacity (settings as
+    typed or as echoed by the firmware, strings) and next_pour (wall-clock
+    time of the next scheduled pour, or None). Read them as attributes.
+    """
+
+    def __init__(self, **values):
+        self.__dict__["values"] = dict(values)
+        self.__dict__["subscribers"] = []  # (field names, callback)
+    
+    def __getattr__(self, name):
+        try:
+            return self.values[name]
+        except KeyError:
+            raise AttributeError(name)
+    
+    def subscribe(self, names, callback):
+        """Call `callback()` now and whenever any of `names` changes"""
+        self.subscribers.append((set(names), callback))
+        callback()
+    
+    def set(self, **changes):
+        changed = {name for name, value in changes.items() if self.values.get(name) != value}
+        if not changed:
+            return
+        self.values.update(changes)
+        for names, callback in self.subscribers:
+            if names & changed:
+                callback()
 
 class PelletDispenserGUI:
     def __init__(self, root):
@@ -16,21 +371,36 @@ class PelletDispenserGUI:
         self.serial_port = None
         self.connected = False
         self.reading_thread = None
+        self.command_writer = None
         self.running = True
+        self.ready = False  # Arduino has finished resetting
+        self.ready_after = None
+        self.port_watch_stop = threading.Event()
+        
+        # Lines from the reader thread waiting for the Tk thread
+        self.message_queue = deque()
+        self.dispatch_lock = threading.Lock()
+        self.dispatch_armed = False
         
-        # Status variables
-        self.system_running = tk.BooleanVar()
-        self.refill_needed = tk.BooleanVar()
+        # Parameter entries
         self.cal_weight = tk.StringVar(value="0.0")
         self.pour_weight = tk.StringVar(value="0.0")
         self.time_between = tk.StringVar(value="0")
         self.hopper_weight = tk.StringVar(value="100.0")  # Default 100g capacity
         
-        # New variables for hopper visualization
-        self.current_hopper_weight = tk.DoubleVar(value=100.0)  # Current weight in hopper
-        self.max_hopper_weight = tk.DoubleVar(value=100.0)  # Max capacity
-        self.time_to_next_pour = tk.IntVar(value=0)  # Time remaining until next pour
-        self.last_pour_time = None
+        # Status, hopper level and pour schedule
+        self.state = DispenserState(
+            running=False, refill=False,
+            hopper_weight=100.0, hopper_max=100.0,  # Current weight and max capacity
+            cal_weight=self.cal_weight.get(), pour_weight=self.pour_weight.get(),
+            time_between=self.time_between.get(), hopper_capacity=self.hopper_weight.get(),
+            next_pour=None,
+        )
+        for var, name in ((self.cal_weight, "cal_weight"), (self.pour_weight, "pour_weight"),
+                          (self.time_between, "time_between"), (self.hopper_weight, "hopper_capacity")):
+            var.trace_add("write", lambda *args, var=var, name=name: self.state.set(**{name: var.get()}))
+        self.countdown_after = None
+        self.countdown_shown = None
         
         self.setup_gui()
         
@@ -45,9 +415,9 @@ class PelletDispenserGUI:
         
         ttk.Label(conn_frame, text="COM Port:").grid(row=0, column=0, padx=(0, 5))
         self.port_var = tk.StringVar(value="COM3")
-        port_combo = ttk.Combobox(conn_frame, textvariable=self.port_var, width=10)
-        port_combo['values'] = self.get_serial_ports()
-        port_combo.grid(row=0, column=1, padx=(0, 10))
+        # Filled in by the port watcher thread
+        self.port_combo = ttk.Combobox(conn_frame, textvariable=self.port_var, width=10)
+        self.port_combo.grid(row=0, column=1, padx=(0, 10))
         
         self.connect_btn = ttk.Button(conn_frame, text="Connect", command=self.toggle_connection)
         self.connect_btn.grid(row=0, column=2)
@@ -55,6 +425,10 @@ class PelletDispenserGUI:
         self.status_label = ttk.Label(conn_frame, text="Disconnected", foreground="red")
         self.status_label.grid(row=0, column=3, padx=(10, 0))
         
+        # Round trip time of the last acknowledged command
+        self.rtt_label = ttk.Label(conn_frame, text="", foreground="gray")
+        self.rtt_label.grid(row=0, column=4, padx=(10, 0))
+        
         # Parameters frame
         params_frame = ttk.LabelFrame(main_frame, text="Parameters", padding="10")
         params_frame.grid(row=1, column=0, sticky=(tk.W, tk.E, tk.N), padx=(0, 10))
@@ -144,12 +518,7 @@ class PelletDispenserGUI:
         output_frame = ttk.LabelFrame(main_frame, text="Serial Output", padding="5")
         output_frame.grid(row=3, column=0, columnspan=3, sticky=(tk.W, tk.E, tk.N, tk.S), pady=(10, 0))
         
-        self.output_text = scrolledtext.ScrolledText(output_frame, height=12, width=80)
-        self.output_text.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
-        
-        # Clear output button
-        clear_btn = ttk.Button(output_frame, text="Clear Output", command=self.clear_output)
-        clear_btn.grid(row=1, column=0, pady=(5, 0))
+        self.console = SerialConsole(output_frame, self.root)
         
         # Configure grid weights
         self.root.columnconfigure(0, weight=1)
@@ -158,12 +527,20 @@ class PelletDispenserGUI:
         main_frame.columnconfigure(1, weight=1)
         main_frame.columnconfigure(2, weight=1)
         main_frame.rowconfigure(3, weight=1)  # Changed from row 2 to 3
-        output_frame.columnconfigure(0, weight=1)
-        output_frame.rowconfigure(0, weight=1)
         
-        # Update settings display and hopper visualization
-        self.update_settings_display()
-        self.update_countdown_timer()
+        # Settings, status and countdown follow the state model
+        self.bind_state()
+        
+        # Enumerate ports in the background so the window comes up immediately
+        threading.Thread(target=self.watch_ports, daemon=True).start()
+    
+    def bind_state(self):
+        """Subscribe the status widgets to the state model"""
+        self.state.subscribe(("running",), self.show_running)
+        self.state.subscribe(("refill",), self.show_refill)
+        self.state.subscribe(("cal_weight", "pour_weight", "time_between", "hopper_capacity", "running", "refill"),
+                             self.update_settings_display)
+        self.state.subscribe(("running", "next_pour"), self.update_countdown_timer)
         
     def create_hopper_display(self, parent):
         """Create the visual hopper display"""
@@ -208,66 +585,82 @@ class PelletDispenserGUI:
         ttk.Button(btn_frame, text="Refill", command=self.simulate_refill, width=8).pack(side=tk.LEFT, padx=(0, 5))
         ttk.Button(btn_frame, text="Pour", command=self.simulate_pour, width=8).pack(side=tk.LEFT)
         
-        # Draw initial hopper
-        self.draw_hopper()
+        # Draw initial hopper; redrawn whenever the level or capacity changes
+        self.create_hopper_items()
+        self.state.subscribe(("hopper_weight", "hopper_max"), self.draw_hopper)
         
-    def draw_hopper(self):
-        """Draw the hopper with current fill level"""
-        self.hopper_canvas.delete("all")
+    def create_hopper_items(self):
+        """Create the hopper canvas items once; draw_hopper() only updates them"""
+        canvas = self.hopper_canvas
         
         # Hopper dimensions
         canvas_width = 200
-        canvas_height = 150
-        hopper_width = 120
+        hopper_top_width = 120
+        hopper_bottom_width = 60
         hopper_height = 120
-        hopper_x = (canvas_width - hopper_width) // 2
+        hopper_x = (canvas_width - hopper_top_width) // 2
         hopper_y = 20
+        inset = (hopper_top_width - hopper_bottom_width) // 2
+        
+        # Outline corners: top left, top right, bottom right, bottom left
+        self.hopper_corners = [
+            (hopper_x, hopper_y),
+            (hopper_x + hopper_top_width, hopper_y),
+            (hopper_x + hopper_top_width - inset, hopper_y + hopper_height),
+            (hopper_x + inset, hopper_y + hopper_height),
+        ]
+        canvas.create_polygon(*[c for corner in self.hopper_corners for c in corner],
+                              outline='black', fill='lightgray', width=2)
+        
+        # Pellets (fill level); coordinates and colour are set by draw_hopper()
+        self.hopper_fill = canvas.create_polygon(0, 0, 0, 0, 0, 0, outline='darkgreen', width=1, state='hidden')
+        
+        # Pellet texture: a grid of small circles over the whole hopper, one
+        # tag per row, created once. Tk canvases can't clip, so rows above
+        # the fill level are hidden instead.
+        pellet_size = 4
+        spacing = 8
+        self.pellet_rows = []
+        for row, y in enumerate(range(hopper_y + pellet_size, hopper_y + hopper_height - pellet_size, spacing)):
+            width_at_y = hopper_top_width - 2 * inset * (y + pellet_size - hopper_y) / hopper_height
+            left = hopper_x + (hopper_top_width - width_at_y) / 2 + 2
+            right = left + width_at_y - 4
+            tag = f"pellets{row}"
+            for x in range(int(left), int(right) - pellet_size, spacing):
+                canvas.create_oval(x, y, x + pellet_size, y + pellet_size,
+                                   fill='darkgreen', outline='', state='hidden', tags=(tag,))
+            self.pellet_rows.append((y, tag))
+        self.pellet_row_tops = [y for y, _ in self.pellet_rows]
+        self.first_pellet_row = len(self.pellet_rows)  # rows from here down are shown
         
-        # Calculate fill level
-        current_weight = self.current_hopper_weight.get()
-        max_weight = self.max_hopper_weight.get()
+        # Draw spout
+        spout_width = 20
+        spout_height = 15
+        spout_x = hopper_x + (hopper_top_width - spout_width) // 2
+        spout_y = hopper_y + hopper_height
+        canvas.create_rectangle(spout_x, spout_y, spout_x + spout_width, spout_y + spout_height,
+                                fill='gray', outline='black', width=2)
+    
+    def draw_hopper(self):
+        """Update the hopper items and labels for the current fill level"""
+        current_weight = self.state.hopper_weight
+        max_weight = self.state.hopper_max
         
+        # Calculate fill level
         if max_weight > 0:
             fill_ratio = min(current_weight / max_weight, 1.0)
         else:
             fill_ratio = 0
         
-        # Draw hopper outline (trapezoid shape)
-        hopper_top_width = hopper_width
-        hopper_bottom_width = 60
-        
-        # Hopper coordinates
-        x1 = hopper_x
-        y1 = hopper_y
-        x2 = hopper_x + hopper_top_width
-        y2 = hopper_y
-        x3 = hopper_x + hopper_top_width - (hopper_top_width - hopper_bottom_width) // 2
-        y3 = hopper_y + hopper_height
-        x4 = hopper_x + (hopper_top_width - hopper_bottom_width) // 2
-        y4 = hopper_y + hopper_height
-        
-        # Draw hopper outline
-        self.hopper_canvas.create_polygon(x1, y1, x2, y2, x3, y3, x4, y4, 
-                                         outline='black', fill='lightgray', width=2)
-        
-        # Draw pellets (fill level)
+        (x1, y1), (x2, y2), (x3, y3), (x4, y4) = self.hopper_corners
+        canvas = self.hopper_canvas
         if fill_ratio > 0:
-            fill_height = hopper_height * fill_ratio
-            fill_y_start = hopper_y + hopper_height - fill_height
+            fill_height = (y3 - y1) * fill_ratio
+            fill_y_start = y3 - fill_height
             
-            # Calculate width at fill level
-            height_ratio = fill_height / hopper_height
-            fill_width_top = hopper_bottom_width + (hopper_top_width - hopper_bottom_width) * (1 - height_ratio)
-            
-            # Fill coordinates
-            fx1 = hopper_x + (hopper_top_width - fill_width_top) // 2
-            fy1 = fill_y_start
-            fx2 = fx1 + fill_width_top
-            fy2 = fill_y_start
-            fx3 = x3
-            fy3 = y3
-            fx4 = x4
-            fy4 = y4
+            # Width at fill level
+            fill_width_top = (x3 - x4) + ((x2 - x1) - (x3 - x4)) * fill_ratio
+            fx1 = x1 + ((x2 - x1) - fill_width_top) // 2
             
             # Choose fill color based on level
             if fill_ratio > 0.5:
@@ -277,78 +670,45 @@ class PelletDispenserGUI:
             else:
                 fill_color = 'lightcoral'
             
-            self.hopper_canvas.create_polygon(fx1, fy1, fx2, fy2, fx3, fy3, fx4, fy4,
-                                            fill=fill_color, outline='darkgreen', width=1)
-            
-            # Draw pellet texture
-            self.draw_pellet_texture(fx1, fy1, fx2, fy2, fx3, fy3, fx4, fy4)
-        
-        # Draw spout
-        spout_width = 20
-        spout_height = 15
-        spout_x = hopper_x + (hopper_top_width - spout_width) // 2 + (hopper_top_width - hopper_bottom_width) // 2
-        spout_y = hopper_y + hopper_height
+            canvas.coords(self.hopper_fill, fx1, fill_y_start, fx1 + fill_width_top, fill_y_start, x3, y3, x4, y4)
+            canvas.itemconfigure(self.hopper_fill, fill=fill_color, state='normal')
+        else:
+            fill_y_start = y3
+            canvas.itemconfigure(self.hopper_fill, state='hidden')
         
-        self.hopper_canvas.create_rectangle(spout_x, spout_y, spout_x + spout_width, spout_y + spout_height,
-                                          fill='gray', outline='black', width=2)
+        # Show pellet rows below the fill line, touching only rows that changed
+        first = bisect_left(self.pellet_row_tops, fill_y_start)
+        for row in range(min(first, self.first_pellet_row), max(first, self.first_pellet_row)):
+            canvas.itemconfigure(self.pellet_rows[row][1], state='normal' if row >= first else 'hidden')
+        self.first_pellet_row = first
         
         # Update labels
         self.weight_remaining_label.config(text=f"{current_weight:.1f} g")
         
         fill_percent = int(fill_ratio * 100)
-        self.fill_percentage_label.config(text=f"{fill_percent}%")
-        
-        # Update fill percentage label color
+        # Update fill percentage label and its color
         if fill_percent > 50:
-            self.fill_percentage_label.config(foreground="green")
+            self.fill_percentage_label.config(text=f"{fill_percent}%", foreground="green")
         elif fill_percent > 20:
-            self.fill_percentage_label.config(foreground="orange")
+            self.fill_percentage_label.config(text=f"{fill_percent}%", foreground="orange")
         else:
-            self.fill_percentage_label.config(foreground="red")
-    
-    def draw_pellet_texture(self, x1, y1, x2, y2, x3, y3, x4, y4):
-        """Draw small circles to represent pellets"""
-        # Simple pellet representation with small circles
-        pellet_size = 4
-        spacing = 8
-        
-        # Calculate bounds
-        min_x = min(x1, x4)
-        max_x = max(x2, x3)
-        min_y = y1
-        max_y = max(y3, y4)
-        
-        for y in range(int(min_y + pellet_size), int(max_y), spacing):
-            # Calculate width at this height
-            height_ratio = (y - min_y) / (max_y - min_y)
-            width_at_y = min_x + (max_x - min_x) * height_ratio
-            left_bound = min_x + (width_at_y - min_x) * height_ratio / 2
-            right_bound = max_x - (width_at_y - min_x) * height_ratio / 2
-            
-            for x in range(int(left_bound), int(right_bound), spacing):
-                if x + pellet_size < right_bound:
-                    self.hopper_canvas.create_oval(x, y, x + pellet_size, y + pellet_size,
-                                                 fill='darkgreen', outline='')
+            self.fill_percentage_label.config(text=f"{fill_percent}%", foreground="red")
     
     def simulate_pour(self):
         """Simulate a pour operation for testing"""
         try:
             pour_amount = float(self.pour_weight.get()) if self.pour_weight.get() else 5.0
-            current = self.current_hopper_weight.get()
-            new_weight = max(0, current - pour_amount)
-            self.current_hopper_weight.set(new_weight)
-            self.draw_hopper()
+            new_weight = max(0, self.state.hopper_weight - pour_amount)
+            self.state.set(hopper_weight=new_weight)
             
             # Reset pour timer properly
-            if self.time_between.get().isdigit() and int(self.time_between.get()) > 0:
-                self.last_pour_time = time.time()
+            self.schedule_next_pour()
             
             self.log_message(f"Simulated pour: {pour_amount}g (Remaining: {new_weight:.1f}g)")
             
             # Check if refill is needed
-            max_weight = self.max_hopper_weight.get()
-            if new_weight / max_weight < 0.1:  # Less than 10% remaining
-                self.refill_indicator.config(text="YES", foreground="red")
+            if new_weight / self.state.hopper_max < 0.1:  # Less than 10% remaining
+                self.state.set(refill=True)
                 self.log_message("Refill needed!")
             
         except ValueError:
@@ -356,68 +716,107 @@ class PelletDispenserGUI:
     
     def simulate_refill(self):
         """Simulate refilling the hopper"""
-        max_weight = self.max_hopper_weight.get()
-        self.current_hopper_weight.set(max_weight)
-        self.refill_indicator.config(text="NO", foreground="green")
-        self.draw_hopper()
+        max_weight = self.state.hopper_max
+        self.state.set(hopper_weight=max_weight, refill=False)
         self.log_message(f"Hopper refilled to {max_weight:.1f}g")
     
     def set_hopper_capacity(self):
         """Set the maximum hopper capacity"""
         try:
             new_capacity = float(self.hopper_weight.get())
-            self.max_hopper_weight.set(new_capacity)
-            
             # If current weight exceeds new capacity, adjust it
-            if self.current_hopper_weight.get() > new_capacity:
-                self.current_hopper_weight.set(new_capacity)
-            
-            self.draw_hopper()
+            self.state.set(hopper_max=new_capacity, hopper_weight=min(self.state.hopper_weight, new_capacity))
             self.send_command(f"hopper {self.hopper_weight.get()}")
             self.log_message(f"Hopper capacity set to {new_capacity:.1f}g")
         except ValueError:
             messagebox.showerror("Invalid Value", "Please enter a valid number for hopper capacity")
     
+    def schedule_next_pour(self, **changes):
+        """Start the pour countdown from now if a time between pours is set; return True if it was
+
+        Any other state `changes` are applied in the same update.
+        """
+        interval = self.time_between.get()
+        scheduled = interval.isdigit() and int(interval) > 0
+        if scheduled:
+            changes["next_pour"] = time.time() + int(interval)
+        self.state.set(**changes)
+        return scheduled
+    
+    def show_running(self):
+        if self.state.running:
+            self.running_indicator.config(text="YES", foreground="green")
+        else:
+            self.running_indicator.config(text="NO", foreground="red")
+    
+    def show_refill(self):
+        if self.state.refill:
+            self.refill_indicator.config(text="YES", foreground="red")
+        else:
+            self.refill_indicator.config(text="NO", foreground="green")
+    
     def update_countdown_timer(self):
-        """Update the countdown timer for next pour"""
-        try:
-            if (self.last_pour_time and 
-                self.time_between.get().isdigit() and 
-                int(self.time_between.get()) > 0 and
-                self.running_indicator.cget('text') == "YES"):
-                
-                time_between = int(self.time_between.get())
-                elapsed = time.time() - self.last_pour_time
-                remaining = max(0, time_between - int(elapsed))
-                
-                if remaining > 0:
-                    mins, secs = divmod(remaining, 60)
-                    if mins > 0:
-                        self.next_pour_label.config(text=f"{mins}m {secs}s", foreground="orange")
-                    else:
-                        if secs <= 5:
-                            self.next_pour_label.config(text=f"{secs}s", foreground="red")
-                        else:
-                            self.next_pour_label.config(text=f"{secs}s", foreground="orange")
+        """Update the countdown timer for next pour
+
+        Runs on state changes, then once per displayed second while a pour
+        is scheduled. Each tick is timed from `next_pour` itself, so the
+        countdown stays on wall-clock seconds instead of drifting.
+        """
+        if self.countdown_after:
+            self.root.after_cancel(self.countdown_after)
+            self.countdown_after = None
+        
+        state = self.state
+        if state.running and state.next_pour is not None:
+            remaining = state.next_pour - time.time()
+            if remaining > 0:
+                shown = math.ceil(remaining)
+                mins, secs = divmod(shown, 60)
+                if mins > 0:
+                    self.show_countdown(f"{mins}m {secs}s", "orange")
                 else:
-                    self.next_pour_label.config(text="Ready", foreground="green")
-                    # Note: Timer stays at "Ready" until next pour resets it
+                    self.show_countdown(f"{secs}s", "red" if secs <= 5 else "orange")
+                # Next update when the shown second runs out
+                delay = int((remaining - (shown - 1)) * 1000) + 1
+                self.countdown_after = self.root.after(delay, self.update_countdown_timer)
             else:
-                if self.running_indicator.cget('text') == "YES":
-                    self.next_pour_label.config(text="Running", foreground="blue")
-                else:
-                    self.next_pour_label.config(text="Stopped", foreground="gray")
-        except Exception as e:
-            self.next_pour_label.config(text="Error", foreground="red")
-            
-        # Schedule next update
-        self.root.after(1000, self.update_countdown_timer)
+                # Timer stays at "Ready" until next pour resets it
+                self.show_countdown("Ready", "green")
+        elif state.running:
+            self.show_countdown("Running", "blue")
+        else:
+            self.show_countdown("Stopped", "gray")
+    
+    def show_countdown(self, text, color):
+        if (text, color) != self.countdown_shown:
+            self.countdown_shown = (text, color)
+            self.next_pour_label.config(text=text, foreground=color)
 
     def get_serial_ports(self):
-        """Get a list of available serial ports"""
+        """Get a list of available serial ports, plus "bus" while the acquisition daemon is running"""
         import serial.tools.list_ports
+        from Acquisition_Daemon import bus_available
         ports = serial.tools.list_ports.comports()
-        return [port.device for port in ports] if ports else ["COM3", "COM4", "COM5"]
+        bus = ["bus"] if bus_available() else []
+        return bus + [port.device for port in ports] if bus or ports else ["COM3", "COM4", "COM5"]
+    
+    def watch_ports(self):
+        """Port watcher thread: scan now and every PORT_SCAN_INTERVAL s, updating the list when it changes"""
+        known = None
+        while True:
+            ports = self.get_serial_ports()
+            if ports != known:
+                known = ports
+                self.root.after(0, lambda ports=ports: self.update_port_list(ports))
+            if self.port_watch_stop.wait(PORT_SCAN_INTERVAL):
+                return
+    
+    def update_port_list(self, ports):
+        first = not self.port_combo['values']
+        self.port_combo['values'] = ports
+        # Preselect a detected port instead of the COM3 placeholder
+        if first and ports and self.port_var.get() not in ports:
+            self.port_var.set(ports[0])
     
     def toggle_connection(self):
         if not self.connected:
@@ -426,28 +825,79 @@ class PelletDispenserGUI:
             self.disconnect_from_arduino()
     
     def connect_to_arduino(self):
-        try:
-            self.serial_port = serial.Serial(self.port_var.get(), 9600, timeout=1)
-            time.sleep(2)  # Wait for Arduino to reset
-            self.connected = True
-            self.connect_btn.config(text="Disconnect")
-            self.status_label.config(text="Connected", foreground="green")
-            
-            # Start reading thread
-            self.running = True
-            self.reading_thread = threading.Thread(target=self.read_serial_data)
-            self.reading_thread.daemon = True
-            self.reading_thread.start()
-            
-            self.log_message("Connected to Arduino")
-            
-        except Exception as e:
-            messagebox.showerror("Connection Error", f"Failed to connect: {str(e)}")
+        """Open the port in the background; the GUI stays responsive while the Arduino resets"""
+        self.connect_btn.config(state='disabled')
+        self.status_label.config(text="Connecting...", foreground="orange")
+        port = self.port_var.get()
+        
+        def open_port():
+            try:
+                if port == "bus" or port.startswith("bus:"):
+                    # Acquisition_Daemon.py owns the Arduino; "bus:NAME" picks one of several
+                    from Acquisition_Daemon import BusPort
+                    serial_port = BusPort(device=port[4:] or None)
+                else:
+                    serial_port = serial.Serial(port, 9600, timeout=1)
+            except Exception as e:
+                self.root.after(0, lambda e=e: self.connect_failed(e))
+                return
+            self.root.after(0, lambda: self.port_opened(serial_port))
+        
+        threading.Thread(target=open_port, daemon=True).start()
+    
+    def connect_failed(self, error):
+        self.connect_btn.config(state='normal')
+        self.status_label.config(text="Disconnected", foreground="red")
+        messagebox.showerror("Connection Error", f"Failed to connect: {str(error)}")
+    
+    def port_opened(self, serial_port):
+        self.serial_port = serial_port
+        self.connected = True
+        self.ready = False
+        self.connect_btn.config(text="Disconnect", state='normal')
+        self.status_label.config(text="Waiting for Arduino...", foreground="orange")
+        
+        # Commands queue up in the writer until the Arduino is ready
+        self.command_writer = CommandWriter(
+            self.serial_port,
+            on_sent=lambda command: self.root.after(0, lambda: self.log_message(f"Sent: {command}")),
+            on_timeout=lambda command: self.root.after(
+                0, lambda: self.log_message(f"No reply to '{command}' after {COMMAND_TIMEOUT:g} s")),
+            on_error=lambda command, e: self.root.after(
+                0, lambda: messagebox.showerror("Send Error", f"Failed to send command: {str(e)}")),
+        )
+        
+        # Start reading thread; the firmware banner marks the end of the reset
+        self.running = True
+        self.reading_thread = threading.Thread(target=self.read_serial_data)
+        self.reading_thread.daemon = True
+        self.reading_thread.start()
+        self.ready_after = self.root.after(int(READY_TIMEOUT * 1000), self.arduino_ready)
+    
+    def arduino_ready(self):
+        """Called on the firmware banner, or after READY_TIMEOUT without one"""
+        if self.ready or not self.connected:
+            return
+        if self.ready_after:
+            self.root.after_cancel(self.ready_after)
+            self.ready_after = None
+        self.ready = True
+        self.status_label.config(text="Connected", foreground="green")
+        if self.command_writer:
+            self.command_writer.start()
+        self.log_message("Connected to Arduino")
     
     def disconnect_from_arduino(self):
         self.running = False
         self.connected = False
-        
+        self.ready = False
+        
+        if self.ready_after:
+            self.root.after_cancel(self.ready_after)
+            self.ready_after = None
+        if self.command_writer:
+            self.command_writer.stop()
+            self.command_writer = None
         if self.serial_port and self.serial_port.is_open:
             self.serial_port.close()
         
@@ -456,150 +906,135 @@ class PelletDispenserGUI:
         self.log_message("Disconnected from Arduino")
     
     def read_serial_data(self):
-        buffer = ""
+        """Reader thread: wait for bytes and hand each complete line to the GUI thread"""
+        buffer = bytearray()
         while self.running and self.connected:
             try:
-                if self.serial_port and self.serial_port.in_waiting:
-                    # Read available data
-                    data = self.serial_port.read(self.serial_port.in_waiting).decode('utf-8', errors='ignore')
-                    buffer += data
-                    
-                    # Process complete lines
-                    while '\n' in buffer:
-                        line, buffer = buffer.split('\n', 1)
-                        line = line.strip()
-                        if line:
-                            self.root.after(0, lambda msg=line: self.log_message(f"Arduino: {msg}"))
-                            self.root.after(0, lambda msg=line: self.parse_arduino_response(msg))
-                
-                time.sleep(0.05)  # Reduced sleep time for better responsiveness
+                # Block until at least one byte arrives (or the 1 s port
+                # timeout passes), then take everything else already waiting
+                data = self.serial_port.read(max(1, self.serial_port.in_waiting))
             except Exception as e:
-                self.root.after(0, lambda err=str(e): self.log_message(f"Read error: {err}"))
+                if self.connected:  # closing the port on disconnect also ends up here
+                    self.root.after(0, lambda err=str(e): self.log_message(f"Read error: {err}"))
                 break
+            if not data:
+                continue
+            buffer += data
+
+            # Process complete lines, keeping any partial line for the next read
+            start = 0
+            end = buffer.find(b"\n")
+            while end >= 0:
+                line = buffer[start:end].strip().decode('utf-8', errors='ignore')
+                if line:
+                    self.queue_message(line)
+                start = end + 1
+                end = buffer.find(b"\n", start)
+            del buffer[:start]
+    
+    def queue_message(self, line):
+        """Reader thread: queue a line and wake the Tk thread if it isn't already dispatching"""
+        with self.dispatch_lock:
+            self.message_queue.append((time.monotonic(), line))
+            if self.dispatch_armed:
+                return
+            self.dispatch_armed = True
+        self.root.after(0, self.dispatch_messages)
+    
+    def dispatch_messages(self):
+        """Tk thread: parse and log up to DISPATCH_BATCH queued lines"""
+        count = min(len(self.message_queue), DISPATCH_BATCH)
+        for _ in range(count):
+            arrival, line = self.message_queue.popleft()
+            reply = self.command_writer.match_reply(line, arrival) if self.command_writer else None
+            if reply:
+                command, rtt = reply
+                self.log_message(f"Arduino: {line}  [{command}: {rtt * 1000:.0f} ms]")
+                self.rtt_label.config(text=f"{command.split(' ', 1)[0]}: {rtt * 1000:.0f} ms")
+            else:
+                self.log_message(f"Arduino: {line}")
+            self.parse_arduino_response(line)
+        
+        # Stay armed for one tick so a burst is handled at most once per tick
+        with self.dispatch_lock:
+            if not self.message_queue and not count:
+                self.dispatch_armed = False
+                return
+        self.root.after(DISPATCH_TICK_MS, self.dispatch_messages)
     
     def parse_arduino_response(self, response):
         """Parse Arduino responses to update GUI status and hopper display"""
-        # Log what we're parsing for debugging
-        self.log_message(f"Parsing: {response}")
-        
-        if "System started" in response:
-            self.running_indicator.config(text="YES", foreground="green")
-            # Reset pour timer when system starts
-            if self.time_between.get().isdigit() and int(self.time_between.get()) > 0:
-                self.last_pour_time = time.time()
-                self.log_message("Pour timer started")
-        elif "System stopped" in response:
-            self.running_indicator.config(text="NO", foreground="red")
-            # Stop pour timer when system stops
-            self.last_pour_time = None
-            self.log_message("Pour timer stopped")
-        elif "Refill needed" in response or "Refill Required" in response:
-            self.refill_indicator.config(text="YES", foreground="red")
-        elif "Refill:N" in response:
-            self.refill_indicator.config(text="NO", foreground="green")
+        event = parse_response(response)
+        if event is None:
+            return
         
-        # Look for various pour-related messages
-        elif any(keyword in response.lower() for keyword in ["poured:", "dispensed:", "pour complete", "manual pour"]):
-            self.handle_pour_event(response)
-            
-        # Look for weight readings
-        elif any(keyword in response.lower() for keyword in ["current weight:", "weight:", "remaining:"]):
-            self.handle_weight_update(response)
-            
-        # Look for timing information
-        elif any(keyword in response.lower() for keyword in ["next pour in", "time remaining", "countdown"]):
-            self.handle_timing_update(response)
+        if event.kind == "ready":
+            self.arduino_ready()
+        elif event.kind == "state":
+            if event.value:
+                # Reset pour timer when system starts
+                if self.schedule_next_pour(running=True):
+                    self.log_message("Pour timer started")
+            else:
+                # Stop pour timer when system stops
+                self.state.set(running=False, next_pour=None)
+                self.log_message("Pour timer stopped")
+        elif event.kind == "status":
+            self.state.set(running=event.value["running"], refill=event.value["refill"])
+        elif event.kind == "refill":
+            self.state.set(refill=True)
+        elif event.kind == "pour":
+            self.handle_pour_event(event.value)
+        elif event.kind == "weight":
+            self.handle_weight_update(event.value)
+        elif event.kind == "timing":
+            self.handle_timing_update(event.value)
     
-    def handle_pour_event(self, response):
-        """Handle pour-related messages from Arduino"""
+    def handle_pour_event(self, pour_amount):
+        """Handle a pour of `pour_amount` grams (None: the set pour weight)"""
         try:
-            # Try to extract pour amount from various message formats
-            pour_amount = None
-            response_lower = response.lower()
-            
-            # Try different patterns
-            if "poured:" in response_lower:
-                pour_amount = float(response.split("Poured:")[1].split("g")[0].strip())
-            elif "dispensed:" in response_lower:
-                pour_amount = float(response.split("Dispensed:")[1].split("g")[0].strip())
-            elif "pour complete" in response_lower:
+            if pour_amount is None:
                 # Use the set pour weight if no amount specified
                 pour_amount = float(self.pour_weight.get()) if self.pour_weight.get() else 0
-            elif "manual pour" in response_lower:
-                pour_amount = float(self.pour_weight.get()) if self.pour_weight.get() else 0
             
-            if pour_amount is not None and pour_amount > 0:
+            if pour_amount > 0:
                 # Update hopper weight
-                current = self.current_hopper_weight.get()
-                new_weight = max(0, current - pour_amount)
-                self.current_hopper_weight.set(new_weight)
-                self.draw_hopper()
+                new_weight = max(0, self.state.hopper_weight - pour_amount)
+                self.state.set(hopper_weight=new_weight)
                 
                 # Reset pour timer
-                if self.time_between.get().isdigit() and int(self.time_between.get()) > 0:
-                    self.last_pour_time = time.time()
+                if self.schedule_next_pour():
                     self.log_message(f"Pour detected: {pour_amount}g. Timer reset. Remaining: {new_weight:.1f}g")
                 
-        except (ValueError, IndexError, AttributeError) as e:
+        except ValueError as e:
             self.log_message(f"Error parsing pour amount: {e}")
     
-    def handle_weight_update(self, response):
-        """Handle weight update messages from Arduino"""
-        try:
-            # Try to extract weight from various message formats
-            weight = None
-            response_lower = response.lower()
-            
-            if "current weight:" in response_lower:
-                weight = float(response.split("Current weight:")[1].split("g")[0].strip())
-            elif "weight:" in response_lower:
-                weight = float(response.split("weight:")[1].split("g")[0].strip())
-            elif "remaining:" in response_lower:
-                weight = float(response.split("remaining:")[1].split("g")[0].strip())
-            
-            if weight is not None and weight >= 0:
-                self.current_hopper_weight.set(weight)
-                self.draw_hopper()
-                self.log_message(f"Weight updated to: {weight:.1f}g")
-                
-        except (ValueError, IndexError, AttributeError) as e:
-            self.log_message(f"Error parsing weight: {e}")
+    def handle_weight_update(self, weight):
+        """Handle a hopper weight reading from Arduino"""
+        if weight >= 0:
+            self.state.set(hopper_weight=weight)
+            self.log_message(f"Weight updated to: {weight:.1f}g")
     
-    def handle_timing_update(self, response):
+    def handle_timing_update(self, seconds):
         """Handle timing-related messages from Arduino"""
-        try:
-            # This could be used if Arduino sends timing info
-            # For now, we'll rely on our own timer
-            pass
-        except Exception as e:
-            self.log_message(f"Error parsing timing: {e}")
+        # This could be used if Arduino sends timing info
+        # For now, we'll rely on our own timer
+        pass
     
     def send_command(self, command):
-        if not self.connected or not self.serial_port:
+        if not self.connected or not self.command_writer:
             messagebox.showwarning("Not Connected", "Please connect to Arduino first")
             return
         
-        # Use threading to prevent GUI blocking
-        def send_in_thread():
-            try:
-                self.serial_port.write(f"{command}\n".encode())
-                self.serial_port.flush()  # Ensure data is sent immediately
-                self.root.after(0, lambda: self.log_message(f"Sent: {command}"))
-            except Exception as e:
-                self.root.after(0, lambda: messagebox.showerror("Send Error", f"Failed to send command: {str(e)}"))
-        
-        # Send command in separate thread to avoid blocking
-        send_thread = threading.Thread(target=send_in_thread)
-        send_thread.daemon = True
-        send_thread.start()
+        # Written in order by the writer thread, so the GUI never blocks
+        self.command_writer.send(command)
     
     def start_system(self):
         self.start_btn.config(state='disabled')  # Prevent multiple clicks
         self.send_command("start")
         
         # Start pour timer if system starts
-        if self.time_between.get().isdigit():
-            self.last_pour_time = time.time()
+        self.schedule_next_pour()
         
         self.root.after(1000, lambda: self.start_btn.config(state='normal'))  # Re-enable after 1 second
     
@@ -608,7 +1043,7 @@ class PelletDispenserGUI:
         self.send_command("stop")
         
         # Stop pour timer
-        self.last_pour_time = None
+        self.state.set(next_pour=None)
         
         self.root.after(1000, lambda: self.stop_btn.config(state='normal'))  # Re-enable after 1 second
     
@@ -638,32 +1073,30 @@ class PelletDispenserGUI:
         self.root.after(500, lambda: self.alarm_off_btn.config(state='normal'))
     
     def log_message(self, message):
-        timestamp = datetime.now().strftime("%H:%M:%S")
-        self.output_text.insert(tk.END, f"[{timestamp}] {message}\n")
-        self.output_text.see(tk.END)
+        self.console.write(message)
     
     def clear_output(self):
-        self.output_text.delete(1.0, tk.END)
+        self.console.clear()
     
     def update_settings_display(self):
-        settings = f"""Calibration: {self.cal_weight.get()} g
-Pour Weight: {self.pour_weight.get()} g
-Time Between: {self.time_between.get()} s
-Hopper Capacity: {self.hopper_weight.get()} g
+        state = self.state
+        settings = f"""Calibration: {state.cal_weight} g
+Pour Weight: {state.pour_weight} g
+Time Between: {state.time_between} s
+Hopper Capacity: {state.hopper_capacity} g
 
-System Running: {self.running_indicator.cget('text')}
-Refill Needed: {self.refill_indicator.cget('text')}"""
+System Running: {"YES" if state.running else "NO"}
+Refill Needed: {"YES" if state.refill else "NO"}"""
         
         self.settings_text.delete(1.0, tk.END)
         self.settings_text.insert(1.0, settings)
-        
-        # Schedule next update
-        self.root.after(2000, self.update_settings_display)
     
     def on_closing(self):
         self.running = False
+        self.port_watch_stop.set()
         if self.connected:
             self.disconnect_from_arduino()
+        self.console.close()
         self.root.destroy()
 
 def main():
@@ -1,16 +1,1101 @@
 import serial
 import time
-import matplotlib.pyplot as plt
-import matplotlib.animation as animation
 import numpy as np
 from datetime import datetime
+from collections import deque
+import argparse
 import glob
+import json
+import math
+import os
 import sys
+import threading
+import warnings
+
+# --- Filament spec ---
+TARGET_THICKNESS = 1.75  # mm
+LOWER_LIMIT = 1.65  # mm
+UPPER_LIMIT = 1.85  # mm
+RECENT_WINDOW = 200  # samples shown on the plot and used for "Last 200" stats
+
+# --- Running statistics ---
+class RunningStats:
+    """Constant-time running stats for the whole run and the last N samples
+
+    Uses Welford's update for the total and an add/remove update for the
+    window, so each sample costs the same no matter how long the run is.
+    Std values are population std (ddof=0) to match np.std.
+    """
+
+    def __init__(self, window=RECENT_WINDOW, lower=LOWER_LIMIT, upper=UPPER_LIMIT):
+        self.window = window
+        self.lower = lower
+        self.upper = upper
+        self.reset()
+
+    def reset(self):
+        # Whole run
+        self.count = 0
+        self._mean = 0.0
+        self._m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        self.below_spec = 0
+        self.above_spec = 0
+
+        # Last N samples
+        self._recent = deque(maxlen=self.window)
+        self._recent_mean = 0.0
+        self._recent_m2 = 0.0
+        self._evictions = 0
+
+    def update(self, x):
+        """Add one reading"""
+        x = float(x)
+
+        # Whole run (Welford)
+        self.count += 1
+        delta = x - self._mean
+        self._mean += delta / self.count
+        self._m2 += delta * (x - self._mean)
+
+        if x < self.min:
+            self.min = x
+        if x > self.max:
+            self.max = x
+        if x < self.lower:
+            self.below_spec += 1
+        elif x > self.upper:
+            self.above_spec += 1
+
+        # Last N samples
+        if len(self._recent) == self.window:
+            old = self._recent[0]
+            self._recent.append(x)
+            n = self.window
+            old_mean = self._recent_mean
+            self._recent_mean += (x - old) / n
+            self._recent_m2 += (x - old) * (x - self._recent_mean + old - old_mean)
+
+            # Add/remove updates slowly accumulate rounding error, so rebuild
+            # the window sums once per full turnover (amortised O(1))
+            self._evictions += 1
+            if self._evictions >= self.window:
+                self._resync_recent()
+        else:
+            self._recent.append(x)
+            n = len(self._recent)
+            delta = x - self._recent_mean
+            self._recent_mean += delta / n
+            self._recent_m2 += delta * (x - self._recent_mean)
+
+    def _resync_recent(self):
+        n = len(self._recent)
+        mean = math.fsum(self._recent) / n
+        self._recent_mean = mean
+        self._recent_m2 = math.fsum((v - mean) ** 2 for v in self._recent)
+        self._evictions = 0
+
+    @property
+    def mean(self):
+        return self._mean if self.count else math.nan
+
+    @property
+    def std(self):
+        return math.sqrt(max(self._m2, 0.0) / self.count) if self.count else math.nan
+
+    @property
+    def recent_count(self):
+        return len(self._recent)
+
+    @property
+    def recent_mean(self):
+        return self._recent_mean if self._recent else math.nan
+
+    @property
+    def recent_std(self):
+        n = len(self._recent)
+        return math.sqrt(max(self._recent_m2, 0.0) / n) if n else math.nan
+
+    @property
+    def out_of_spec(self):
+        return self.below_spec + self.above_spec
+
+# --- Sample storage ---
+class RingBuffer:
+    """Fixed-size rolling window of (time, thickness) pairs
+
+    Every sample is written twice, at i and i + capacity, so the newest
+    `capacity` samples are always one contiguous slice of the backing
+    array. `times` and `values` are views into it, so plotting never copies
+    and appending never allocates.
+    """
+
+    def __init__(self, capacity=RECENT_WINDOW):
+        self.capacity = capacity
+        self._data = np.zeros((2 * capacity, 2), dtype=np.float64)
+        self._start = 0
+        self._size = 0
+
+    def append(self, t, value):
+        end = (self._start + self._size) % self.capacity
+        self._data[end] = (t, value)
+        self._data[end + self.capacity] = (t, value)
+        if self._size < self.capacity:
+            self._size += 1
+        else:
+            self._start = (self._start + 1) % self.capacity
+
+    def extend(self, times, values):
+        """Append arrays of samples in one vectorised write"""
+        n = len(times)
+        if n >= self.capacity:
+            # Only the newest `capacity` samples survive
+            self._data[:self.capacity, 0] = times[-self.capacity:]
+            self._data[:self.capacity, 1] = values[-self.capacity:]
+            self._data[self.capacity:] = self._data[:self.capacity]
+            self._start = 0
+            self._size = self.capacity
+            return
+        end = (self._start + self._size) % self.capacity
+        idx = (end + np.arange(n)) % self.capacity
+        self._data[idx, 0] = times
+        self._data[idx, 1] = values
+        self._data[idx + self.capacity, 0] = times
+        self._data[idx + self.capacity, 1] = values
+        overflow = max(self._size + n - self.capacity, 0)
+        self._size = min(self._size + n, self.capacity)
+        self._start = (self._start + overflow) % self.capacity
+
+    def clear(self):
+        self._start = 0
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def view(self):
+        """(N, 2) view of the window, oldest first"""
+        return self._data[self._start:self._start + self._size]
+
+    @property
+    def times(self):
+        return self.view()[:, 0]
+
+    @property
+    def values(self):
+        return self.view()[:, 1]
+
+
+class HistoryStore:
+    """Append-only store for the whole run, grown in fixed-size chunks
+
+    Samples live in preallocated float64 (time, thickness) chunks, i.e. 16
+    bytes per sample, and a new chunk is only allocated once the current
+    one is full.
+    """
+
+    def __init__(self, chunk_size=65536):
+        self.chunk_size = chunk_size
+        self._chunks = []
+        self._fill = chunk_size  # forces a chunk on first append
+        self._size = 0
+
+    def append(self, t, value):
+        if self._fill == self.chunk_size:
+            self._chunks.append(np.empty((self.chunk_size, 2), dtype=np.float64))
+            self._fill = 0
+        self._chunks[-1][self._fill] = (t, value)
+        self._fill += 1
+        self._size += 1
+
+    def extend(self, times, values):
+        """Append arrays of samples, filling the current chunk before allocating another"""
+        done = 0
+        n = len(times)
+        while done < n:
+            if self._fill == self.chunk_size:
+                self._chunks.append(np.empty((self.chunk_size, 2), dtype=np.float64))
+                self._fill = 0
+            take = min(n - done, self.chunk_size - self._fill)
+            self._chunks[-1][self._fill:self._fill + take, 0] = times[done:done + take]
+            self._chunks[-1][self._fill:self._fill + take, 1] = values[done:done + take]
+            self._fill += take
+            done += take
+        self._size += n
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def nbytes(self):
+        return sum(chunk.nbytes for chunk in self._chunks)
+
+    def chunks(self):
+        """Yield (N, 2) views of the filled part of each chunk, oldest first"""
+        for chunk in self._chunks[:-1]:
+            yield chunk
+        if self._chunks:
+            yield self._chunks[-1][:self._fill]
+
+    def to_array(self):
+        """Copy the whole run into a single (N, 2) array"""
+        if not self._chunks:
+            return np.empty((0, 2), dtype=np.float64)
+        return np.concatenate(list(self.chunks()))
+
+    @property
+    def times(self):
+        return self.to_array()[:, 0]
+
+    @property
+    def values(self):
+        return self.to_array()[:, 1]
+
+class MinMaxPyramid:
+    """Multi-resolution min/max summary of the whole run for plotting
+
+    Level 0 holds one (t_of_min, min, t_of_max, max) bucket per
+    `bucket_size` samples and every level above merges `fanout` buckets of
+    the one below. Buckets are completed as samples arrive, so `points()`
+    only picks the finest level that fits the point budget and never has
+    to touch the raw history. Drawing both the min and the max of every
+    bucket keeps short spikes visible at any zoom.
+    """
+
+    def __init__(self, bucket_size=16, fanout=4):
+        self.bucket_size = bucket_size
+        self.fanout = fanout
+        self._levels = []
+        self._counts = []
+        self._pending = [0.0, math.inf, 0.0, -math.inf]
+        self._pending_count = 0
+        self.count = 0
+
+    def append(self, t, value):
+        p = self._pending
+        if value < p[1]:
+            p[0], p[1] = t, value
+        if value > p[3]:
+            p[2], p[3] = t, value
+        self._pending_count += 1
+        self.count += 1
+        if self._pending_count == self.bucket_size:
+            self._push(0, p)
+            self._pending = [0.0, math.inf, 0.0, -math.inf]
+            self._pending_count = 0
+
+    def _push(self, level, bucket):
+        if level == len(self._levels):
+            self._levels.append(np.empty((64, 4), dtype=np.float64))
+            self._counts.append(0)
+        data = self._levels[level]
+        n = self._counts[level]
+        if n == len(data):
+            data = self._levels[level] = np.concatenate([data, np.empty_like(data)])
+        data[n] = bucket
+        n = self._counts[level] = n + 1
+
+        if n % self.fanout == 0:
+            block = data[n - self.fanout:n]
+            i_min = block[:, 1].argmin()
+            i_max = block[:, 3].argmax()
+            self._push(level + 1, (block[i_min, 0], block[i_min, 1], block[i_max, 2], block[i_max, 3]))
+
+    def points(self, max_points=2000):
+        """(times, values) covering the whole run in at most ~max_points points"""
+        budget = max(max_points // 2, 1)
+        level = 0
+        while level < len(self._levels) - 1 and self._counts[level] > budget:
+            level += 1
+
+        # Buckets at the chosen level, then the finer buckets and raw
+        # samples that have not been merged up to it yet
+        segments = []
+        if self._levels:
+            segments.append(self._levels[level][:self._counts[level]])
+            covered = self._counts[level]
+            for lvl in range(level - 1, -1, -1):
+                segments.append(self._levels[lvl][covered * self.fanout:self._counts[lvl]])
+                covered = self._counts[lvl]
+        if self._pending_count:
+            segments.append(np.array([self._pending]))
+        if not segments:
+            return np.empty(0), np.empty(0)
+        buckets = np.concatenate(segments)
+
+        # Emit each bucket's min and max in time order
+        swap = buckets[:, 0] > buckets[:, 2]
+        times = np.empty(2 * len(buckets))
+        values = np.empty(2 * len(buckets))
+        times[0::2] = np.where(swap, buckets[:, 2], buckets[:, 0])
+        times[1::2] = np.where(swap, buckets[:, 0], buckets[:, 2])
+        values[0::2] = np.where(swap, buckets[:, 3], buckets[:, 1])
+        values[1::2] = np.where(swap, buckets[:, 1], buckets[:, 3])
+        return times, values
+
+# --- Oscillation spectrum ---
+class SpectrumAnalyzer:
+    """Amplitude spectrum of the last `window` samples
+
+    New samples go into a RingBuffer, and the spectrum is one rfft of its
+    contiguous view, redone only when samples have arrived since the last
+    call. The cost per frame is one FFT of the window, however long the
+    run or however many samples the frame brought.
+
+    The Hann window is applied to the bins (a 3-tap convolution), and
+    amplitudes are peak mm of a sinusoid. The sample rate is taken from
+    the gauge times in the window, assuming they're evenly spaced.
+    """
+
+    def __init__(self, window=1024, pour_interval=None, peaks=3):
+        self.window = window
+        self.pour_interval = pour_interval  # s
+        self.peaks = peaks
+        self.buffer = RingBuffer(window)
+        self._bins = None
+
+    @property
+    def ready(self):
+        return len(self.buffer) == self.window and self.sample_rate > 0
+
+    def extend(self, times, values):
+        if not len(values):
+            return
+        # A rebooted gauge restarts its clock; samples from before the reset
+        # don't share a time base with the new ones, so start the window over
+        times = np.asarray(times)
+        values = np.asarray(values)
+        resets = np.flatnonzero(np.diff(times) < 0)
+        if len(resets):
+            times = times[resets[-1] + 1:]
+            values = values[resets[-1] + 1:]
+            self.buffer.clear()
+        elif len(self.buffer) and times[0] < self.buffer.times[-1]:
+            self.buffer.clear()
+        self.buffer.extend(times, values)
+        self._bins = None
+
+    @property
+    def bins(self):
+        """rfft of the window, cached until the next extend()"""
+        if self._bins is None:
+            self._bins = np.fft.rfft(self.buffer.values)
+        return self._bins
+
+    @property
+    def sample_rate(self):
+        """Hz, from the gauge times (ms) spanned by the window"""
+        times = self.buffer.times
+        span = (times[-1] - times[0]) / 1000.0 if len(times) > 1 else 0.0
+        return (len(times) - 1) / span if span > 0 else math.nan
+
+    def spectrum(self):
+        """(frequencies in Hz, amplitudes in mm); DC and the bin next to it are zeroed"""
+        x = self.bins
+        y = 0.5 * x
+        y[1:-1] -= 0.25 * (x[:-2] + x[2:])
+        amplitudes = 4.0 * np.abs(y) / self.window
+        amplitudes[:2] = 0.0  # the mean and its Hann leakage
+        return np.arange(len(x)) * (self.sample_rate / self.window), amplitudes
+
+    def dominant(self):
+        """Up to `peaks` (Hz, mm) local maxima standing well above the noise floor, largest first"""
+        if not self.ready:
+            return []
+        freqs, amps = self.spectrum()
+        a = amps[1:-1]
+        is_peak = (a > amps[:-2]) & (a >= amps[2:]) & (a > 4.0 * np.median(amps[2:]))
+        idx = np.flatnonzero(is_peak) + 1
+        idx = idx[np.argsort(amps[idx])[::-1][:self.peaks]]
+        found = []
+        step = freqs[1]
+        for k in idx.tolist():
+            # Parabolic interpolation between bins for the frequency
+            left, mid, right = amps[k - 1], amps[k], amps[k + 1]
+            denom = left - 2 * mid + right
+            offset = 0.5 * (left - right) / denom if denom else 0.0
+            found.append(((k + offset) * step, mid - 0.25 * (left - right) * offset))
+        return found
+
+    def matches_pour(self, freq):
+        """True if `freq` is within 1.5 bins (or 10%) of the configured pour frequency"""
+        if not self.pour_interval:
+            return False
+        pour_freq = 1.0 / self.pour_interval
+        return abs(freq - pour_freq) <= max(1.5 * self.sample_rate / self.window, 0.1 * pour_freq)
+
+    def format(self, separator="\n"):
+        if not self.ready:
+            return f"Spectrum: {len(self.buffer)}/{self.window} samples"
+        peaks = self.dominant()
+        if not peaks:
+            return "Spectrum: no dominant peak"
+        return separator.join(
+            f"{freq:7.3f} Hz ({1 / freq:6.1f} s) {amp:6.4f} mm" + ("  <- pour interval" if self.matches_pour(freq) else "")
+            for freq, amp in peaks)
+
+# --- Serial acquisition ---
+def _byte_weights(default, weights):
+    table = np.full(256, default, dtype=np.uint8)
+    for chars, weight in weights:
+        table[np.frombuffer(chars, dtype=np.uint8)] = weight
+    return table
+
+# Per-line sum is exactly 1 for a well-formed sample line: one comma, and
+# only number characters and whitespace otherwise
+_SAMPLE_WEIGHTS = _byte_weights(2, [(b"0123456789.+-eE \t\r\n", 0), (b",", 1)])
+_NONBLANK_WEIGHTS = _byte_weights(1, [(b" \t\r\n", 0)])
+_NEWLINE = ord("\n")
+
+class BatchParser:
+    """Parses many "time,thickness" lines at once into numpy arrays
+
+    `feed()` takes raw serial bytes and keeps any unterminated trailing
+    line for the next call. Complete lines are checked with per-byte
+    weights summed per line (one comma, only number characters) and all the good ones
+    are converted by a single np.fromstring call instead of split/float
+    per line. Non-blank lines that are not a valid "time,thickness" pair
+    are counted in `rejected`.
+    """
+
+    def __init__(self):
+        self._partial = b""
+        self.rejected = 0
+        self.parsed = 0
+
+    def feed(self, data):
+        """Return (times, thicknesses, lines) for every complete line in data"""
+        data = self._partial + data
+        cut = data.rfind(b"\n") + 1
+        self._partial = data[cut:]
+        if not cut:
+            return np.empty(0), np.empty(0), []
+        block = data[:cut]
+
+        # Per-line byte weight sums over the whole buffer in one pass
+        buf = np.frombuffer(block, dtype=np.uint8)
+        ends = np.flatnonzero(buf == _NEWLINE)
+        starts = np.concatenate(([0], ends[:-1] + 1))
+        valid = np.add.reduceat(_SAMPLE_WEIGHTS[buf], starts, dtype=np.int64) == 1
+
+        if valid.all():
+            text = block.decode("ascii")
+        else:
+            keep = np.flatnonzero(valid)
+            blank = np.add.reduceat(_NONBLANK_WEIGHTS[buf], starts, dtype=np.int64) == 0
+            self.rejected += int(np.count_nonzero(~valid & ~blank))
+            text = b"".join(block[starts[i]:ends[i] + 1] for i in keep).decode("ascii")
+        if not text:
+            return np.empty(0), np.empty(0), []
+
+        lines = text.split("\n")[:-1]
+        if any(c in text for c in " \t\r"):
+            lines = [raw_line.strip() for raw_line in lines]
+
+        try:
+            with warnings.catch_warnings():
+                # Older numpy only warns when parsing stops early; newer raises
+                warnings.simplefilter("error", DeprecationWarning)
+                samples = np.fromstring(text.replace("\n", ","), sep=",")
+        except (ValueError, DeprecationWarning):
+            samples = None
+        if samples is not None and len(samples) == 2 * len(lines):
+            samples = samples.reshape(-1, 2)
+        else:
+            # Something like "1.2.3" or "e,5" got through the byte checks;
+            # fall back to per-line parsing for this batch only
+            samples, lines = self._parse_lines(lines)
+
+        self.parsed += len(samples)
+        return samples[:, 0], samples[:, 1], lines
+
+    def _parse_lines(self, lines):
+        good_lines = []
+        good = []
+        for raw_line in lines:
+            try:
+                t_str, thick_str = raw_line.split(",")
+                good.append((float(t_str), float(thick_str)))
+                good_lines.append(raw_line)
+            except ValueError:
+                self.rejected += 1
+        return np.array(good, dtype=np.float64).reshape(-1, 2), good_lines
+
+
+class SerialReader:
+    """Background thread that drains the serial port into a byte buffer
+
+    The reader never waits on the plot: it reads whatever bytes are
+    available and queues them unparsed. Each animation frame then takes
+    everything that arrived since the last frame with `drain()` and hands
+    it to a BatchParser, so acquisition and render rates are independent.
+    """
+
+    def __init__(self, ser, max_pending=100000):
+        self.ser = ser
+        self._chunks = deque(maxlen=max_pending)  # append/popleft are thread-safe
+        self._running = False
+        self._thread = None
+        self.dropped = 0
+        self.error = None
+        self.arrival = None  # monotonic time the oldest chunk of the last drain() arrived
+
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+        if self._thread:
+            self._thread.join(timeout=2)
+
+    def _run(self):
+        synced = False
+        while self._running:
+            try:
+                # Block for at least one byte (up to the port timeout), then
+                # take everything else that is already waiting
+                data = self.ser.read(max(1, self.ser.in_waiting))
+            except Exception as e:
+                self.error = e
+                break
+            if data and not synced:
+                # The port may have opened mid-line; a fragment like "45,1.75"
+                # would still parse, so drop everything up to the first newline
+                cut = data.find(b"\n") + 1
+                if not cut:
+                    continue
+                data = data[cut:]
+                synced = True
+            if data:
+                if len(self._chunks) == self._chunks.maxlen:
+                    self.dropped += 1
+                self._chunks.append((time.monotonic(), data))
+
+    @property
+    def pending(self):
+        return len(self._chunks)
+
+    def drain(self):
+        """Return every byte received since the last call"""
+        chunks = []
+        for _ in range(len(self._chunks)):
+            chunks.append(self._chunks.popleft())
+        self.arrival = chunks[0][0] if chunks else None
+        return b"".join(data for _, data in chunks)
+
+# --- Data sources ---
+# A source is anything with start(), read() -> bytes received so far (never
+# blocks), close() and a `finished` flag, plus `error`, the exception that
+# ended it early (if any); ThicknessMonitor feeds what it reads to a
+# BatchParser, so every source exercises the same pipeline.
+# After each read, `arrival` is the monotonic time the oldest returned
+# sample arrived (or was due), for LatencyProbe.
+
+class SerialSource:
+    """Live gauge on an open serial port; finished once the reader has died and been drained"""
+
+    def __init__(self, ser):
+        self.ser = ser
+        self.reader = SerialReader(ser)
+
+    def start(self):
+        self.reader.start()
+
+    @property
+    def error(self):
+        return self.reader.error
+
+    @property
+    def finished(self):
+        return self.reader.error is not None and not self.reader.pending
+
+    @property
+    def arrival(self):
+        return self.reader.arrival
+
+    def read(self):
+        return self.reader.drain()
+
+    def close(self):
+        self.reader.stop()
+        self.ser.close()
+
+
+def load_log_session(path, session=-1):
+    """(times, lines) for one session of a data_log.csv or binary log
+
+    `lines` are the encoded "time,thickness\\n" lines; malformed CSV lines
+    are dropped.
+    """
+    if os.path.exists(path + ".idx.json"):
+        times, values = BinaryLogReader(path).session(session)
+        lines = [f"{t:.10g},{v:.10g}\n".encode() for t, v in zip(times.tolist(), values.tolist())]
+        return np.array(times), lines
+
+    chunks = [[]]
+    with open(path, "rb") as f:
+        for raw_line in f:
+            if raw_line.startswith(b"# Log started:"):
+                chunks.append([])
+            else:
+                chunks[-1].append(raw_line)
+
+    sessions = []
+    for chunk in chunks:
+        times, _, lines = BatchParser().feed(b"".join(chunk) + b"\n")
+        if len(times):
+            sessions.append((times, [(raw_line + "\n").encode() for raw_line in lines]))
+    return sessions[session] if sessions else (np.empty(0), [])
+
+
+class ReplaySource:
+    """Replays a recorded session at `speed` times real time (None = as fast as possible)
+
+    Samples are released against the wall clock using their recorded gauge
+    times, at most `max_batch` per read so one frame never stalls.
+    """
+
+    def __init__(self, path, speed=1.0, session=-1, max_batch=10000):
+        self.times, self.lines = load_log_session(path, session)
+        self.speed = speed
+        self.max_batch = max_batch
+        self._next = 0
+        self._t0 = None
+        self.arrival = None
+
+    error = None
+
+    @property
+    def finished(self):
+        return self._next >= len(self.lines)
+
+    def start(self):
+        self._t0 = time.monotonic()
+
+    def read(self):
+        if self.finished:
+            return b""
+        if self._t0 is None:
+            self.start()
+        start = self._next
+        now = time.monotonic()
+        if self.speed is None:
+            stop = start + self.max_batch
+            self.arrival = now
+        else:
+            elapsed_ms = (now - self._t0) * 1000.0 * self.speed
+            stop = int(np.searchsorted(self.times, self.times[0] + elapsed_ms, side="right"))
+            stop = min(stop, start + self.max_batch)
+            if start < len(self.times):
+                self.arrival = self._t0 + (self.times[start] - self.times[0]) / (1000.0 * self.speed)
+        self._next = max(start, min(stop, len(self.lines)))
+        return b"".join(self.lines[start:self._next])
+
+    def close(self):
+        pass
+
+
+class SyntheticSource:
+    """Generated readings at `rate` Hz (None = as fast as possible) with Gaussian noise
+
+    The signal is the old test fallback, 1.75 + 0.05 sin(n / 10) mm, on a
+    gauge clock of one sample per 1000 / rate ms (100 ms at max speed).
+    """
+
+    finished = False
+    error = None
+
+    def __init__(self, rate=10.0, noise=0.0, max_batch=10000, seed=None):
+        self.rate = rate
+        self.noise = noise
+        self.max_batch = max_batch
+        self.period_ms = 1000.0 / rate if rate else 100.0
+        self._rng = np.random.default_rng(seed)
+        self._emitted = 0
+        self._t0 = None
+        self.arrival = None
+
+    def start(self):
+        self._t0 = time.monotonic()
+
+    def read(self):
+        if self._t0 is None:
+            self.start()
+        now = time.monotonic()
+        if self.rate:
+            due = int((now - self._t0) * self.rate) - self._emitted
+            self.arrival = self._t0 + (self._emitted + 1) / self.rate
+        else:
+            due = self.max_batch
+            self.arrival = now
+        count = min(due, self.max_batch)
+        if count <= 0:
+            return b""
+
+        n = np.arange(self._emitted, self._emitted + count)
+        self._emitted += count
+        times = n * self.period_ms
+        thicknesses = 1.75 + 0.05 * np.sin(n / 10)
+        if self.noise:
+            thicknesses += self._rng.normal(0.0, self.noise, count)
+        return "".join(f"{t:.0f},{v:.3f}\n" for t, v in zip(times.tolist(), thicknesses.tolist())).encode()
+
+    def close(self):
+        pass
+
+
+class BusSource:
+    """One gauge's samples from the acquisition daemon (Acquisition_Daemon.py)
+
+    The daemon owns the port and has already parsed the samples; they are
+    turned back into lines so they take the same path as every other
+    source. Events pile up in a deque between frames, so a slow redraw
+    never holds up the socket.
+    """
+
+    finished = False
+    error = None
+
+    def __init__(self, device, path=None, max_pending=100000):
+        from Acquisition_Daemon import BUS_SOCKET, BusClient
+
+        self.device = device
+        self._events = deque(maxlen=max_pending)  # append/popleft are thread-safe
+        self.client = BusClient(path or BUS_SOCKET, topics=("thickness",), devices=[device],
+                                on_event=self._events.append)
+        self.arrival = None
+
+    def start(self):
+        self.client.start()
+
+    def read(self):
+        events = []
+        for _ in range(len(self._events)):
+            events.append(self._events.popleft())
+        if events and events[-1] is None:
+            self.finished = True
+            self.error = OSError("acquisition daemon closed the connection")
+            events.pop()
+        self.arrival = events[0]["t"] if events else None
+        return "".join(f"{t:.10g},{v:.10g}\n" for event in events
+                       for t, v in zip(event["times"], event["values"])).encode()
+
+    def close(self):
+        self.client.close()
+
+# --- Data logging ---
+class LogWriter:
+    """Keeps the CSV log open and writes samples in batches
+
+    Lines are buffered and written out once `flush_lines` are pending or
+    `flush_interval` seconds have passed, and the file is fsynced every
+    `fsync_interval` seconds and on close, so a crash loses at most that
+    window. Console echo is optional and limited to one line per
+    `echo_interval` seconds.
+    """
+
+    def __init__(self, filename, header="Time(ms),Thickness(mm)", flush_lines=100,
+                 flush_interval=1.0, fsync_interval=10.0, echo=True, echo_interval=1.0):
+        self.filename = filename
+        self.flush_lines = flush_lines
+        self.flush_interval = flush_interval
+        self.fsync_interval = fsync_interval
+        self.echo = echo
+        self.echo_interval = echo_interval
+
+        self._file = open(filename, "a", buffering=1 << 16)
+        self._pending = []
+        self._unsynced = False
+        now = time.monotonic()
+        self._last_flush = now
+        self._last_fsync = now
+        self._last_echo = -math.inf
+        self._echo_skipped = 0
+        self.lines_written = 0
+
+        self._file.write(f"\n# Log started: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
+        if header:
+            self._file.write(header + "\n")
+        self.fsync()
+
+    def write(self, raw_line):
+        """Queue one log line"""
+        self.write_many([raw_line])
+
+    def write_many(self, raw_lines):
+        if not raw_lines:
+            return
+        self._pending.extend(raw_lines)
+        if self.echo:
+            self._echo(raw_lines[-1], len(raw_lines) - 1)
+        if len(self._pending) >= self.flush_lines:
+            self.flush()
+
+    def _echo(self, raw_line, also_skipped=0):
+        now = time.monotonic()
+        self._echo_skipped += also_skipped
+        if now - self._last_echo >= self.echo_interval:
+            if self._echo_skipped:
+                print(f"{raw_line}  (+{self._echo_skipped} more)")
+            else:
+                print(raw_line)
+            self._last_echo = now
+            self._echo_skipped = 0
+        else:
+            self._echo_skipped += 1
+
+    def tick(self):
+        """Flush/fsync if their intervals have elapsed; call once per frame"""
+        now = time.monotonic()
+        if self._pending and now - self._last_flush >= self.flush_interval:
+            self.flush()
+        if self._unsynced and now - self._last_fsync >= self.fsync_interval:
+            self.fsync()
+
+    def flush(self):
+        if self._pending:
+            self._file.write("\n".join(self._pending) + "\n")
+            self.lines_written += len(self._pending)
+            self._pending.clear()
+            self._unsynced = True
+        self._file.flush()
+        self._last_flush = time.monotonic()
+
+    def fsync(self):
+        self.flush()
+        os.fsync(self._file.fileno())
+        self._unsynced = False
+        self._last_fsync = time.monotonic()
+
+    def close(self):
+        if self._file.closed:
+            return
+        self.fsync()
+        self._file.close()
+
+# --- Binary session store ---
+BINARY_MAGIC = b"FELFIL01"
+BINARY_HEADER_SIZE = 16  # magic + int64 chunk_rows
+UNKNOWN_START = "unknown"  # session "started" for imported rows that had no start marker
+
+class BinaryLogWriter:
+    """Chunked, columnar binary log with a JSON session index
+
+    The data file is an 8-byte magic and the chunk size, followed by
+    fixed-size chunks of `chunk_rows` float64 times then `chunk_rows`
+    float64 thicknesses. `<path>.idx.json` records the committed row count
+    and, per session, the start time, row range and summary stats, so a
+    reader can memory-map the file and jump straight to one session.
+    Rows past the committed count (e.g. after a crash) are ignored.
+    """
+
+    def __init__(self, path, chunk_rows=4096, flush_interval=5.0, started=None):
+        self.path = path
+        self.index_path = path + ".idx.json"
+        self.flush_interval = flush_interval
+
+        if os.path.exists(path) and os.path.exists(self.index_path):
+            with open(self.index_path) as f:
+                self.index = json.load(f)
+            self.chunk_rows = self.index["chunk_rows"]
+            self._file = open(path, "r+b")
+        elif os.path.exists(path):
+            # Without its index the rows can't be trusted or extended, and
+            # starting afresh would truncate them
+            raise ValueError(f"{path} exists but its index {self.index_path} is missing; "
+                             f"move it aside or restore the index")
+        else:
+            self.chunk_rows = chunk_rows
+            self.index = {"version": 1, "chunk_rows": chunk_rows, "rows": 0, "sessions": []}
+            self._file = open(path, "w+b")
+            self._file.write(BINARY_MAGIC + np.int64(chunk_rows).tobytes())
+
+        # Current (possibly partly filled) chunk, reloaded when appending to an existing file
+        self._chunk = np.zeros((2, self.chunk_rows), dtype=np.float64)
+        self._rows = self.index["rows"]
+        self._fill = self._rows % self.chunk_rows
+        if self._fill:
+            self._file.seek(self._chunk_offset(self._rows // self.chunk_rows))
+            data = np.frombuffer(self._file.read(self._chunk.nbytes), dtype=np.float64)
+            self._chunk[:] = data.reshape(2, self.chunk_rows)
+
+        self.stats = RunningStats()
+        if not isinstance(started, str):  # a datetime, None for now, or UNKNOWN_START
+            started = (started or datetime.now()).strftime("%Y-%m-%d %H:%M:%S")
+        self._session = {
+            "started": started,
+            "row_start": self._rows,
+            "row_end": self._rows,
+        }
+        self.index["sessions"].append(self._session)
+        self._last_flush = time.monotonic()
+        self._dirty = True
+
+    def _chunk_offset(self, chunk):
+        return BINARY_HEADER_SIZE + chunk * self._chunk.nbytes
+
+    def append(self, t, value):
+        self._chunk[0, self._fill] = t
+        self._chunk[1, self._fill] = value
+        self._fill += 1
+        self._rows += 1
+        self.stats.update(value)
+        self._session.setdefault("t_first", t)
+        self._session["t_last"] = t
+        self._dirty = True
+        if self._fill == self.chunk_rows:
+            self._write_chunk()
+            self._chunk[:] = 0
+            self._fill = 0
+
+    def _write_chunk(self):
+        chunk = (self._rows - 1) // self.chunk_rows
+        self._file.seek(self._chunk_offset(chunk))
+        self._file.write(self._chunk.tobytes())
+
+    def tick(self):
+        if self._dirty and time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        """Write the partial chunk, then commit the row count and index"""
+        if self._fill:
+            self._write_chunk()
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+        stats = self.stats
+        self._session.update(
+            row_end=self._rows,
+            count=stats.count,
+            mean=stats.mean if stats.count else None,
+            std=stats.std if stats.count else None,
+            min=stats.min if stats.count else None,
+            max=stats.max if stats.count else None,
+            below_spec=stats.below_spec,
+            above_spec=stats.above_spec,
+        )
+        self.index["rows"] = self._rows
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.index, f, indent=1)
+        os.replace(tmp_path, self.index_path)
+
+        self._last_flush = time.monotonic()
+        self._dirty = False
+
+    def close(self):
+        if self._file.closed:
+            return
+        if not self.stats.count:
+            self.index["sessions"].remove(self._session)  # don't index empty sessions
+        self.flush()
+        self._file.close()
+
+
+class BinaryLogReader:
+    """Memory-mapped reader for files written by BinaryLogWriter"""
+
+    def __init__(self, path):
+        with open(path + ".idx.json") as f:
+            self.index = json.load(f)
+        self.chunk_rows = self.index["chunk_rows"]
+        self.rows = self.index["rows"]
+        self.sessions = self.index["sessions"]
+
+        with open(path, "rb") as f:
+            if f.read(len(BINARY_MAGIC)) != BINARY_MAGIC:
+                raise ValueError(f"{path} is not a thickness binary log")
+        n_chunks = -(-self.rows // self.chunk_rows)
+        if n_chunks:
+            self._data = np.memmap(path, dtype=np.float64, mode="r", offset=BINARY_HEADER_SIZE,
+                                   shape=(n_chunks, 2, self.chunk_rows))
+        else:
+            self._data = np.zeros((0, 2, self.chunk_rows))
+
+    def rows_between(self, start, stop):
+        """(times, thicknesses) for rows [start, stop), touching only the chunks involved"""
+        start = max(0, start)
+        stop = min(stop, self.rows)
+        if stop <= start:
+            return np.empty(0), np.empty(0)
+        first = start // self.chunk_rows
+        last = (stop - 1) // self.chunk_rows
+        block = self._data[first:last + 1]
+        offset = start - first * self.chunk_rows
+        times = block[:, 0, :].reshape(-1)[offset:offset + stop - start]
+        values = block[:, 1, :].reshape(-1)[offset:offset + stop - start]
+        return times, values
+
+    def session(self, i):
+        """(times, thicknesses) for session i (negative indexes count from the end)"""
+        info = self.sessions[i]
+        return self.rows_between(info["row_start"], info["row_end"])
+
+    def time_range(self, i, t_start, t_stop):
+        """Samples of session i with t_start <= time < t_stop (gauge time in ms)"""
+        times, values = self.session(i)
+        # Gauge time is monotonic within a session
+        a, b = np.searchsorted(times, [t_start, t_stop])
+        return times[a:b], values[a:b]
+
+
+def convert_csv_log(csv_path, binary_path):
+    """Import a data_log.csv (one session per '# Log started:' line) into a binary log
+
+    Markers with no rows after them are ignored, and rows before the first
+    marker get an UNKNOWN_START session. Sessions the binary log already
+    holds (same start marker, first and last time and row count) are
+    skipped, so importing the same CSV again adds nothing. Returns
+    (sessions imported, rows imported, sessions skipped).
+    """
+    chunks = [[None, [], []]]  # [start marker, times, thicknesses]; data before any marker has none
+    with open(csv_path) as f:
+        for raw_line in f:
+            raw_line = raw_line.strip()
+            if raw_line.startswith("# Log started:"):
+                chunks.append([raw_line.split(":", 1)[1].strip(), [], []])
+                continue
+            try:
+                t_str, thick_str = raw_line.split(",")
+                t, thick = float(t_str), float(thick_str)
+            except ValueError:
+                continue  # header, blank and malformed lines
+            chunks[-1][1].append(t)
+            chunks[-1][2].append(thick)
+    chunks = [chunk for chunk in chunks if chunk[1]]  # the writer drops empty sessions anyway
+
+    existing = []
+    if os.path.exists(binary_path + ".idx.json"):
+        with open(binary_path + ".idx.json") as f:
+            existing = [(session["started"], session.get("t_first"), session.get("t_last"),
+                         session["row_end"] - session["row_start"]) for session in json.load(f)["sessions"]]
+
+    sessions = rows = skipped = 0
+    for started, times, thicknesses in chunks:
+        key = (times[0], times[-1], len(times))
+        if any(key == other[1:] and started in (None, other[0]) for other in existing):
+            skipped += 1
+            continue
+        started = datetime.strptime(started, "%Y-%m-%d %H:%M:%S") if started else UNKNOWN_START
+        writer = BinaryLogWriter(binary_path, started=started)
+        for t, thick in zip(times, thicknesses):
+            writer.append(t, thick)
+        writer.close()
+        sessions += 1
+        rows += len(times)
+    return sessions, rows, skipped
 
 # --- Serial setup (auto-detect) ---
-def find_serial_port():
+def find_serial_ports():
     # Search for likely serial device patterns
-    candidates = glob.glob('/dev/tty.usbserial-*') + glob.glob('/dev/tty.usbmodem*')
+    return sorted(glob.glob('/dev/tty.usbserial-*') + glob.glob('/dev/tty.usbmodem*'))
+
+def find_serial_port():
+    candidates = find_serial_ports()
     if not candidates:
         print("⚠️  No serial devices found matching /dev/tty.usbserial-* or /dev/tty.usbmodem*")
         print("   Run 'ls /dev/tty.*' to check your device name manually.")
@@ -20,126 +1105,740 @@ def find_serial_port():
     print(f"→ Using port: {candidates[0]}")
     return candidates[0]
 
-try:
-    port = find_serial_port()
-    ser = serial.Serial(port, 9600, timeout=1)
-    time.sleep(2)
-except Exception as e:
-    print(f"Failed to open serial port: {e}")
-    ser = None  # Fallback for testing
-
-# --- Serial setup (manual) ---
-# ser = serial.Serial('/dev/tty.usbserial-14330', 9600, timeout=1)  # Mac
-# ser = serial.Serial('COM3', 9600, timeout=1)  # Windows
-time.sleep(2)
-
-# For testing without Arduino:
-# ser = None
-
-# --- Data storage ---
-all_times = []
-all_thicknesses = []
-recent_times = []
-recent_thicknesses = []
-
-# --- Log file setup ---
-log_filename = "data_log.csv"
-with open(log_filename, "a") as f:
-    f.write(f"\n# Log started: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-    f.write("Time(ms),Thickness(mm)\n")
-
-# --- Plot setup ---
-fig, ax = plt.subplots()
-(line,) = ax.plot([], [], lw=2)
-ax.set_title("Live Thickness Readings")
-ax.set_xlabel("Time (ms)")
-ax.set_ylabel("Thickness (mm)")
-
-# Horizontal reference lines
-ax.axhline(1.65, color="gray", linestyle="--", linewidth=1)
-ax.axhline(1.85, color="gray", linestyle="--", linewidth=1)
-ax.axhline(1.75, color="red", linestyle="-", linewidth=1.5)
-
-text_stats = ax.text(
-    0.02,
-    0.95,
-    "",
-    transform=ax.transAxes,
-    fontsize=11,
-    verticalalignment="top",
-    family="monospace",
-)
-
-# --- Update function ---
-def update(frame):
-    global all_times, all_thicknesses, recent_times, recent_thicknesses
-
-    # Read line from serial (mocked here)
-    if ser:
-        raw_line = ser.readline().decode("utf-8").strip()
-    else:
-        # Simulated test data
-        current_time = len(all_times) * 100
-        simulated_thickness = 1.75 + 0.05 * np.sin(len(all_times) / 10)
-        raw_line = f"{current_time},{simulated_thickness:.3f}"
-        time.sleep(0.1)
-
-    if not raw_line:
-        return line, text_stats
-
+def open_serial(port=None):
+    # No settle delay: the reader thread simply sees nothing until the gauge
+    # has finished resetting. Stale input is flushed here and SerialReader
+    # drops the partial first line, which would otherwise parse as a sample.
     try:
-        t_str, thick_str = raw_line.split(",")
-        t, thick = float(t_str), float(thick_str)
-
-        # Append to full and recent lists
-        all_times.append(t)
-        all_thicknesses.append(thick)
-        recent_times.append(t)
-        recent_thicknesses.append(thick)
-        if len(recent_times) > 200:
-            recent_times = recent_times[-200:]
-            recent_thicknesses = recent_thicknesses[-200:]
-
-        # --- Stats ---
-        mean_total = np.mean(all_thicknesses)
-        std_total = np.std(all_thicknesses)
-        mean_recent = np.mean(recent_thicknesses)
-        std_recent = np.std(recent_thicknesses)
-
-        # --- Update plot ---
-        line.set_data(recent_times, recent_thicknesses)
-        ax.relim()
-        ax.autoscale_view()
-
-        # --- Update stats text ---
-        text_stats.set_text(
-            f"Total Mean:   {mean_total:6.3f} mm\n"
-            f"Total Std:    {std_total:6.3f} mm\n"
-            f"Last 200 Mean:{mean_recent:6.3f} mm\n"
-            f"Last 200 Std: {std_recent:6.3f} mm"
-        )
+        if port is None:
+            port = find_serial_port()
+        ser = serial.Serial(port, 9600, timeout=1)
+        ser.reset_input_buffer()
+    except Exception as e:
+        print(f"Failed to open serial port: {e}")
+        ser = None  # Fallback for testing
+
+    # --- Serial setup (manual) ---
+    # ser = serial.Serial('/dev/tty.usbserial-14330', 9600, timeout=1)  # Mac
+    # ser = serial.Serial('COM3', 9600, timeout=1)  # Windows
+
+    # For testing without Arduino:
+    # ser = None
+    return ser
+
+# --- Acquisition pipeline ---
+def gauge_name(port):
+    """Short label for a gauge, e.g. /dev/tty.usbserial-1410 -> usbserial-1410"""
+    return os.path.basename(port).replace("tty.", "").replace("cu.", "")
+
+def gauge_path(path, name):
+    """Per-gauge variant of a log path, e.g. data_log.csv -> data_log_usbserial-1410.csv"""
+    if not path:
+        return path
+    stem, ext = os.path.splitext(path)
+    return f"{stem}_{name}{ext}"
+
+class ThicknessMonitor:
+    """Data source, sample storage, statistics and log for one gauge"""
+
+    def __init__(self, source, log_filename="data_log.csv", echo=True, binary_log=None, name=None,
+                 probe=None, spectrum=None):
+        self.source = source
+        self.name = name
+        self.probe = probe
+        self.arrival = None  # with a probe, when the oldest sample of the last poll() arrived
+        self.history = HistoryStore()
+        self.recent = RingBuffer(RECENT_WINDOW)
+        self.overview = MinMaxPyramid()
+        self.spectrum = spectrum
+        self.stats = RunningStats()
+        self.log = LogWriter(log_filename, echo=echo)
+        self.binary_log = BinaryLogWriter(binary_log) if binary_log else None
+        self.parser = BatchParser()
+        self._failure_seen = False
+        self.source.start()
+
+    def failure(self):
+        """The error that stopped the source early, returned only the first time it is seen"""
+        if self._failure_seen or not self.source.finished or self.source.error is None:
+            return None
+        self._failure_seen = True
+        return self.source.error
+
+    def poll(self):
+        """Process every line that arrived since the last call; return the sample count"""
+        probe = self.probe
+        if probe:
+            probe.begin()
+        data = self.source.read()
+        if probe:
+            probe.lap("read")
+        times, thicknesses, logged = self.parser.feed(data)
+        if probe:
+            probe.lap("parse")
+
+        # Append to full history and recent window
+        self.history.extend(times, thicknesses)
+        self.recent.extend(times, thicknesses)
+        if self.spectrum:
+            self.spectrum.extend(times, thicknesses)
+
+        for t, thick in zip(times.tolist(), thicknesses.tolist()):
+            # --- Stats and full-run overview ---
+            self.stats.update(thick)
+            self.overview.append(t, thick)
+            if self.binary_log:
+                self.binary_log.append(t, thick)
+        if probe:
+            probe.lap("stats")
 
         # --- Log to file ---
-        with open(log_filename, "a") as f:
-            f.write(raw_line + "\n")
-            print(raw_line)
+        self.log.write_many(logged)
+        self.log.tick()
+        if self.binary_log:
+            self.binary_log.tick()
+        if probe:
+            probe.lap("log")
+            self.arrival = getattr(self.source, "arrival", None) if logged else None
+        return len(logged)
+
+    @property
+    def rejected(self):
+        return self.parser.rejected
+
+    def close(self):
+        self.source.close()
+        self.log.close()
+        if self.binary_log:
+            self.binary_log.close()
+
+def format_stats(stats, rejected=0):
+    text = (
+        f"Total Mean:   {stats.mean:6.3f} mm\n"
+        f"Total Std:    {stats.std:6.3f} mm\n"
+        f"Last 200 Mean:{stats.recent_mean:6.3f} mm\n"
+        f"Last 200 Std: {stats.recent_std:6.3f} mm\n"
+        f"Min / Max:    {stats.min:6.3f} / {stats.max:.3f} mm\n"
+        f"Out of Spec:  {stats.out_of_spec} ({stats.below_spec} low, {stats.above_spec} high)"
+    )
+    if rejected:
+        text += f"\nRejected:     {rejected} lines"
+    return text
+
+def format_summary(stats, name=None, rejected=0):
+    """One-line version of format_stats for the headless console"""
+    label = f" {name}" if name else ""
+    return (
+        f"[{datetime.now().strftime('%H:%M:%S')}]{label} n={stats.count} "
+        f"mean={stats.mean:.3f} std={stats.std:.3f} "
+        f"last{stats.recent_count}={stats.recent_mean:.3f}±{stats.recent_std:.3f} "
+        f"min/max={stats.min:.3f}/{stats.max:.3f} "
+        f"out_of_spec={stats.out_of_spec} ({stats.below_spec} low, {stats.above_spec} high) "
+        f"rejected={rejected}"
+    )
+
+# --- Render performance ---
+class RenderMeter:
+    """Measures achieved frame rate and process CPU use of the plot"""
+
+    def __init__(self, report_interval=5.0):
+        self.report_interval = report_interval
+        self.frames = 0
+        self._wall_start = time.perf_counter()
+        self._cpu_start = time.process_time()
+        self._report_wall = self._wall_start
+        self._report_cpu = self._cpu_start
+        self._report_frames = 0
+
+    def frame(self):
+        self.frames += 1
+        now = time.perf_counter()
+        if now - self._report_wall >= self.report_interval:
+            fps, cpu = self._rates(now, self._report_wall, self._report_cpu, self.frames - self._report_frames)
+            print(f"[perf] {fps:5.1f} FPS, {cpu:5.1f}% CPU")
+            self._report_wall = now
+            self._report_cpu = time.process_time()
+            self._report_frames = self.frames
+
+    def _rates(self, now, wall_start, cpu_start, frames):
+        wall = max(now - wall_start, 1e-9)
+        cpu = time.process_time() - cpu_start
+        return frames / wall, 100.0 * cpu / wall
+
+    def summary(self):
+        fps, cpu = self._rates(time.perf_counter(), self._wall_start, self._cpu_start, self.frames)
+        return f"{self.frames} frames, {fps:.1f} FPS average, {cpu:.1f}% CPU average"
+
+# --- Latency instrumentation ---
+class LatencyProbe:
+    """Per-stage timings for the read -> parse -> stats -> log -> draw path
+
+    Each stage keeps its last `window` durations (for the live p50/p99
+    overlay) and a whole-run histogram on log-spaced bins from 1 us to
+    10 s (for the CSV dump). "arrival_to_pixel" is from when the oldest
+    sample of a frame arrived at the serial port to the end of that
+    frame's draw. Everything is optional: without a probe the pipeline
+    only pays for an `if probe:` check per stage.
+    """
+
+    BINS = np.logspace(-6, 1, 71)  # seconds, 10 per decade
+
+    def __init__(self, window=1000):
+        self.window = window
+        self._recent = {}
+        self._filled = {}
+        self._counts = {}
+        self._t = 0.0
+
+    def begin(self):
+        self._t = time.perf_counter()
 
-    except ValueError:
-        pass  # skip malformed lines
+    def lap(self, stage):
+        """Record the time since begin() or the previous lap() under `stage`"""
+        now = time.perf_counter()
+        self.record(stage, now - self._t)
+        self._t = now
 
-    return line, text_stats
+    def record(self, stage, seconds):
+        if stage not in self._recent:
+            self._recent[stage] = np.zeros(self.window)
+            self._filled[stage] = 0
+            self._counts[stage] = np.zeros(len(self.BINS) + 1, dtype=np.int64)
+        n = self._filled[stage]
+        self._recent[stage][n % self.window] = seconds
+        self._filled[stage] = n + 1
+        self._counts[stage][np.searchsorted(self.BINS, seconds)] += 1
 
-# --- Initialize plot ---
-def init():
-    line.set_data([], [])
-    text_stats.set_text("")
-    return line, text_stats
+    def summary(self):
+        """{stage: (count, p50, p99, max)} over each stage's recent window, in seconds"""
+        result = {}
+        for stage, recent in self._recent.items():
+            n = self._filled[stage]
+            recent = recent[:min(n, self.window)]
+            p50, p99 = np.percentile(recent, [50, 99])
+            result[stage] = (n, p50, p99, recent.max())
+        return result
 
-# --- Animation ---
-ani = animation.FuncAnimation(fig, update, init_func=init, interval=100, blit=False, cache_frame_data=False)
-plt.tight_layout()
-plt.show()
+    def format(self):
+        lines = [f"{'stage':<16}{'p50':>8}{'p99':>8}{'max':>8}  ms"]
+        for stage, (_, p50, p99, peak) in self.summary().items():
+            lines.append(f"{stage:<16}{p50 * 1000:8.2f}{p99 * 1000:8.2f}{peak * 1000:8.2f}")
+        return "\n".join(lines)
+
+    def dump_csv(self, path):
+        """Write the whole-run histograms as stage,bin_low_ms,bin_high_ms,count rows"""
+        edges = np.concatenate(([0.0], self.BINS, [np.inf])) * 1000.0
+        with open(path, "w") as f:
+            f.write("stage,bin_low_ms,bin_high_ms,count\n")
+            for stage, counts in self._counts.items():
+                for i in np.flatnonzero(counts):
+                    f.write(f"{stage},{edges[i]:.6g},{edges[i + 1]:.6g},{counts[i]}\n")
+
+# --- Live plot ---
+MIN_X_HEADROOM_MS = 2000.0  # gauge time left free to the right of the data after a rescale
+
+def _needs_rescale(lo, hi, view_lo, view_hi, shrink):
+    """True if the data left the view or fills less than `shrink` of it"""
+    return lo < view_lo or hi > view_hi or (hi - lo) < shrink * (view_hi - view_lo)
+
+class _GaugeView:
+    """Live and full-run axes for one gauge inside a LivePlot"""
+
+    def __init__(self, monitor, ax, ax_full, animated, multi, ax_spectrum=None):
+        self.monitor = monitor
+        self.ax = ax
+        self.ax_full = ax_full
+        self.ax_spectrum = ax_spectrum
+
+        suffix = f" - {monitor.name}" if multi and monitor.name else ""
+        (self.line,) = ax.plot([], [], lw=2, animated=animated)
+        ax.set_title("Live Thickness Readings" + suffix)
+        ax.set_xlabel("Time (ms)")
+        ax.set_ylabel("Thickness (mm)")
+        self._add_reference_lines(ax)
+
+        self.text_stats = ax.text(
+            0.02,
+            0.95,
+            "",
+            transform=ax.transAxes,
+            fontsize=11,
+            verticalalignment="top",
+            family="monospace",
+            animated=animated,
+        )
+        self.artists = (self.line, self.text_stats)
+
+        if ax_full:
+            (self.line_full,) = ax_full.plot([], [], lw=1, animated=animated)
+            ax_full.set_title("Full Run (min/max)" + suffix)
+            ax_full.set_xlabel("Time (ms)")
+            ax_full.set_ylabel("Thickness (mm)")
+            self._add_reference_lines(ax_full)
+            self.artists += (self.line_full,)
+
+        if ax_spectrum:
+            spectrum = monitor.spectrum
+            (self.line_spectrum,) = ax_spectrum.plot([], [], lw=1, animated=animated)
+            ax_spectrum.set_title(f"Oscillation Spectrum (last {spectrum.window} samples)" + suffix)
+            ax_spectrum.set_xlabel("Frequency (Hz)")
+            ax_spectrum.set_ylabel("Amplitude (mm)")
+            if spectrum.pour_interval:
+                ax_spectrum.axvline(1.0 / spectrum.pour_interval, color="orange", linestyle=":", linewidth=1.5)
+            self.text_peaks = ax_spectrum.text(
+                0.98, 0.95, "", transform=ax_spectrum.transAxes, fontsize=9, family="monospace",
+                verticalalignment="top", horizontalalignment="right", animated=animated,
+            )
+            self.artists += (self.line_spectrum, self.text_peaks)
+
+    def _add_reference_lines(self, ax):
+        # Horizontal reference lines
+        ax.axhline(LOWER_LIMIT, color="gray", linestyle="--", linewidth=1)
+        ax.axhline(UPPER_LIMIT, color="gray", linestyle="--", linewidth=1)
+        ax.axhline(TARGET_THICKNESS, color="red", linestyle="-", linewidth=1.5)
+
+    def clear(self):
+        self.line.set_data([], [])
+        self.text_stats.set_text("")
+        if self.ax_full:
+            self.line_full.set_data([], [])
+        if self.ax_spectrum:
+            self.line_spectrum.set_data([], [])
+            self.text_peaks.set_text("")
+
+    def refresh(self, full_run_points):
+        recent = self.monitor.recent
+        self.line.set_data(recent.times, recent.values)
+        if self.ax_full:
+            self.line_full.set_data(*self.monitor.overview.points(full_run_points))
+        self.text_stats.set_text(format_stats(self.monitor.stats, self.monitor.rejected))
+        if self.ax_spectrum:
+            spectrum = self.monitor.spectrum
+            if spectrum.ready:
+                self.line_spectrum.set_data(*spectrum.spectrum())
+            self.text_peaks.set_text(spectrum.format())
+
+    def autoscale(self):
+        for ax in (self.ax, self.ax_full, self.ax_spectrum):
+            if ax:
+                ax.relim()
+                ax.autoscale_view()
+
+    def fit_views(self):
+        """Rescale axes the data has left; return True if any changed"""
+        recent = self.monitor.recent
+        changed = _fit_view(self.ax, recent.times[0], recent.times[-1],
+                            recent.values.min(), recent.values.max())
+        if self.ax_full:
+            full_times = self.line_full.get_xdata()
+            stats = self.monitor.stats
+            changed |= _fit_view(self.ax_full, full_times[0], full_times[-1], stats.min, stats.max)
+        if self.ax_spectrum and self.monitor.spectrum.ready:
+            freqs, amps = self.line_spectrum.get_data()
+            ax = self.ax_spectrum
+            if not np.isclose(ax.get_xlim()[1], freqs[-1], rtol=0.1):
+                ax.set_xlim(0, freqs[-1])  # follows the gauge's sample rate
+                changed = True
+            peak = max(amps.max(), 1e-4)
+            if _needs_rescale(0.0, peak, *ax.get_ylim(), shrink=0.3):
+                ax.set_ylim(0, 1.25 * peak)
+                changed = True
+        return changed
+
+def _fit_view(ax, t_lo, t_hi, v_lo, v_hi):
+    """Rescale ax if the data left its view; return True if it changed"""
+    changed = False
+
+    # Left edge on the oldest sample, 25% headroom to the right but at least
+    # MIN_X_HEADROOM_MS, so a fast gauge still only rescales every few seconds
+    span = max(t_hi - t_lo, 1.0)
+    headroom = max(0.25 * span, MIN_X_HEADROOM_MS)
+    x_lo, x_hi = ax.get_xlim()
+    if t_lo < x_lo or t_hi > x_hi or span + headroom < 0.5 * (x_hi - x_lo):
+        ax.set_xlim(t_lo, t_hi + headroom)
+        changed = True
+
+    y_lo = min(v_lo, LOWER_LIMIT)
+    y_hi = max(v_hi, UPPER_LIMIT)
+    if _needs_rescale(y_lo, y_hi, *ax.get_ylim(), shrink=0.4):
+        pad = 0.1 * (y_hi - y_lo)
+        ax.set_ylim(y_lo - pad, y_hi + pad)
+        changed = True
+
+    return changed
+
+class LivePlot:
+    """Matplotlib view of one or more ThicknessMonitors
+
+    Each gauge gets a column: the live window on top and, with
+    `full_run`, the whole run from the monitor's min/max overview below,
+    capped at `full_run_points` points. Monitors with a SpectrumAnalyzer
+    get their oscillation spectrum in a bottom row.
+
+    The "blit" renderer only redraws the data lines and stats text each
+    frame, and rescales the axes only when the data leaves the current
+    view (with headroom, so this happens every few seconds rather than
+    every frame). The "full" renderer is the original redraw-everything
+    path, kept for comparison with --perf.
+
+    With a LatencyProbe the monitors' stage timings, the plot update, the
+    draw and arrival-to-pixel latency are shown in the corner of the
+    first live panel. The "full" renderer draws on the next idle event,
+    so there "draw" and "arrival_to_pixel" stop when the draw is queued.
+    """
+
+    def __init__(self, monitors, renderer="blit", meter=None, full_run=True, full_run_points=2000,
+                 probe=None):
+        # Imported here so headless capture never loads matplotlib
+        import matplotlib.pyplot as plt
+
+        if isinstance(monitors, ThicknessMonitor):
+            monitors = [monitors]
+        self.monitors = monitors
+        self.blit = renderer == "blit"
+        self.meter = meter
+        self.probe = probe
+        self.full_run_points = full_run_points
+        self.ani = None
+
+        # --- Plot setup ---
+        spectrum = any(monitor.spectrum for monitor in monitors)
+        ratios = [2] + [1] * full_run + [1] * spectrum
+        cols = len(monitors)
+        self.fig, axes = plt.subplots(
+            len(ratios), cols, squeeze=False, figsize=(8 * cols, 3 + 2 * len(ratios)),
+            gridspec_kw={"height_ratios": ratios})
+
+        self.gauges = []
+        self.artists = ()
+        for col, monitor in enumerate(monitors):
+            gauge = _GaugeView(monitor, axes[0, col], axes[1, col] if full_run else None,
+                               animated=self.blit, multi=cols > 1,
+                               ax_spectrum=axes[-1, col] if monitor.spectrum else None)
+            self.gauges.append(gauge)
+            self.artists += gauge.artists
+
+        if probe:
+            ax = self.gauges[0].ax
+            self.text_latency = ax.text(
+                0.98, 0.95, "", transform=ax.transAxes, fontsize=8, family="monospace",
+                verticalalignment="top", horizontalalignment="right", animated=self.blit,
+                bbox=dict(facecolor="white", alpha=0.8, edgecolor="none"),
+            )
+            self.artists += (self.text_latency,)
+            self._next_latency_text = 0.0
+            self._update_time = 0.0
+
+    # --- Initialize plot ---
+    def init(self):
+        for gauge in self.gauges:
+            gauge.clear()
+        if self.probe:
+            self.text_latency.set_text("")
+        return self.artists
+
+    # --- Update function ---
+    def update(self, frame):
+        if self.meter:
+            self.meter.frame()
+        probe = self.probe
+        if probe:
+            update_start = time.perf_counter()
+
+        changed = False
+        for gauge in self.gauges:
+            received = gauge.monitor.poll()
+            error = gauge.monitor.failure()
+            if error is not None:
+                print(f"{gauge.monitor.name or 'Gauge'} stopped: {error}")
+                gauge.ax.set_title(f"{gauge.ax.get_title()} - stopped: {error}", color="red")
+                changed = True  # the title is part of the background
+            if not received:
+                continue
+            if probe:
+                probe.begin()
+            gauge.refresh(self.full_run_points)
+            if self.blit:
+                changed |= gauge.fit_views()
+            else:
+                gauge.autoscale()
+            if probe:
+                probe.lap("plot")
+
+        if changed:
+            # Ticks and gridlines are part of the blit background, so
+            # redraw it once; the animation re-caches it afterwards
+            if probe:
+                probe.begin()
+            self.fig.canvas.draw()
+            if probe:
+                probe.lap("rescale_draw")
+
+        if probe:
+            now = time.perf_counter()
+            if now >= self._next_latency_text:
+                self.text_latency.set_text(probe.format())
+                self._next_latency_text = now + 1.0
+            self._update_time = time.perf_counter() - update_start
+
+        if self.ani and all(gauge.monitor.source.finished for gauge in self.gauges):
+            self._stop_animation()
+        return self.artists
+
+    def _stop_animation(self):
+        """No source will send anything more: stop the timer and keep the last frame on screen"""
+        self.ani.event_source.stop()
+        for artist in self.artists:
+            artist.set_animated(False)  # otherwise a later redraw would leave them out
+        self.fig.canvas.draw_idle()
+
+    def _frame_drawn(self, frame_time):
+        """Called by the animation after each frame when a probe is attached"""
+        self.probe.record("draw", frame_time - self._update_time)
+        now = time.monotonic()
+        for gauge in self.gauges:
+            if gauge.monitor.arrival is not None:
+                self.probe.record("arrival_to_pixel", now - gauge.monitor.arrival)
+                gauge.monitor.arrival = None
+
+    # --- Animation ---
+    def run(self, interval=100):
+        import matplotlib.pyplot as plt
+        import matplotlib.animation as animation
+
+        Animation = animation.FuncAnimation
+        if self.probe:
+            plot = self
+
+            class Animation(animation.FuncAnimation):
+                # Times the whole frame, including the blit after update()
+                def _step(self, *args):
+                    start = time.perf_counter()
+                    result = super()._step(*args)
+                    plot._frame_drawn(time.perf_counter() - start)
+                    return result
+
+        self.ani = Animation(
+            self.fig, self.update, init_func=self.init, interval=interval,
+            blit=self.blit, cache_frame_data=False,
+        )
+        plt.tight_layout()
+        plt.show()
+
+# --- Headless capture ---
+def run_headless(monitors, summary_interval=10.0, poll_interval=0.1, probe=None):
+    """Read, compute stats and log without a plot until Ctrl-C"""
+    if isinstance(monitors, ThicknessMonitor):
+        monitors = [monitors]
+    print("Headless capture running, press Ctrl-C to stop")
+    next_summary = time.monotonic() + summary_interval
+    try:
+        while True:
+            received = 0
+            for monitor in monitors:
+                received += monitor.poll()
+                error = monitor.failure()
+                if error is not None:
+                    print(f"{monitor.name or 'Gauge'} stopped: {error}")
+            if not received:
+                if all(m.source.finished for m in monitors):
+                    print("All sources finished")
+                    break
+                time.sleep(poll_interval)
+            if time.monotonic() >= next_summary:
+                for monitor in monitors:
+                    print(format_summary(monitor.stats, monitor.name, monitor.rejected))
+                    if monitor.spectrum:
+                        print("  " + monitor.spectrum.format(separator="; "))
+                if probe:
+                    print(probe.format())
+                next_summary += summary_interval
+    except KeyboardInterrupt:
+        pass
+    for monitor in monitors:
+        if monitor.stats.count:
+            print(format_summary(monitor.stats, monitor.name, monitor.rejected))
+            if monitor.spectrum:
+                print("  " + monitor.spectrum.format(separator="; "))
+
+def make_spectrum(args):
+    """A SpectrumAnalyzer for one monitor with --spectrum, else None"""
+    if not args.spectrum:
+        return None
+    return SpectrumAnalyzer(args.spectrum_window, pour_interval=args.pour_interval)
+
+def open_monitors(args, probe=None):
+    """One ThicknessMonitor per requested gauge, each with its own reader thread and logs"""
+    echo = not args.no_echo and not args.headless  # echoing every sample is just noise on an unattended run
+    if args.replay:
+        source = ReplaySource(args.replay, speed=args.replay_speed, session=args.replay_session)
+        print(f"→ Replaying {len(source.lines)} samples from {args.replay}")
+        return [ThicknessMonitor(source, args.log, echo=echo, binary_log=args.binary_log, probe=probe,
+                                 spectrum=make_spectrum(args))]
+    if args.synthetic:
+        source = SyntheticSource(rate=args.rate, noise=args.noise)
+        return [ThicknessMonitor(source, args.log, echo=echo, binary_log=args.binary_log, probe=probe,
+                                 spectrum=make_spectrum(args))]
+    if args.bus:
+        return open_bus_monitors(args, echo, probe)
+
+    ports = args.port or (find_serial_ports() if args.all_ports else None)
+    if not ports:
+        ser = open_serial()
+        source = SerialSource(ser) if ser else SyntheticSource()  # fallback for testing
+        return [ThicknessMonitor(source, args.log, echo=echo, binary_log=args.binary_log, probe=probe,
+                                 spectrum=make_spectrum(args))]
+
+    monitors = []
+    for port in ports:
+        name = gauge_name(port)
+        print(f"→ Gauge {name}: {port}")
+        ser = open_serial(port)
+        if ser is None:
+            # A port asked for by name never falls back to synthetic data, which
+            # would be plotted and logged as if it were this gauge
+            print(f"Skipping gauge {name}")
+            continue
+        source = SerialSource(ser)
+        if len(ports) == 1:
+            log, binary_log = args.log, args.binary_log
+        else:
+            log, binary_log = gauge_path(args.log, name), gauge_path(args.binary_log, name)
+        monitors.append(ThicknessMonitor(source, log, echo=echo, binary_log=binary_log, name=name,
+                                         probe=probe, spectrum=make_spectrum(args)))
+    if not monitors:
+        print("No gauges could be opened")
+        sys.exit(1)
+    return monitors
+
+def open_bus_monitors(args, echo, probe=None):
+    """One ThicknessMonitor per gauge the acquisition daemon publishes (or just --port names)"""
+    from Acquisition_Daemon import BusClient
+
+    try:
+        client = BusClient(args.bus, topics=())
+    except OSError as e:
+        print(f"Failed to reach the acquisition daemon on {args.bus}: {e}")
+        sys.exit(1)
+    client.close()
+    names = [name for name, topic in client.devices.items() if topic == "thickness"]
+    if args.port:
+        names = [name for name in names if name in {gauge_name(port) for port in args.port}]
+    if not names:
+        print(f"No gauges on {args.bus}")
+        sys.exit(1)
+
+    monitors = []
+    for name in names:
+        print(f"→ Gauge {name}: {args.bus}")
+        if len(names) == 1:
+            log, binary_log = args.log, args.binary_log
+        else:
+            log, binary_log = gauge_path(args.log, name), gauge_path(args.binary_log, name)
+        monitors.append(ThicknessMonitor(BusSource(name, args.bus), log, echo=echo, binary_log=binary_log,
+                                         name=name, probe=probe, spectrum=make_spectrum(args)))
+    return monitors
+
+def dump_latency(probe, path):
+    print(probe.format())
+    probe.dump_csv(path)
+    print(f"Latency histograms written to {path}")
+
+def _speed(value):
+    """argparse type: a positive number, or 'max' for as fast as possible (None)"""
+    if value == "max":
+        return None
+    value = float(value)
+    if value <= 0:
+        raise argparse.ArgumentTypeError("must be positive or 'max'")
+    return value
+
+def main():
+    parser = argparse.ArgumentParser(description="Live Felfil filament thickness monitor")
+    parser.add_argument("--log", default="data_log.csv", help="CSV log file (appended)")
+    parser.add_argument("--renderer", choices=["blit", "full"], default="blit",
+                        help="blit: redraw only the data (default); full: redraw the whole figure")
+    parser.add_argument("--interval", type=int, default=100, help="Frame interval in ms")
+    parser.add_argument("--perf", action="store_true", help="Print achieved FPS and CPU use")
+    parser.add_argument("--no-echo", action="store_true", help="Don't echo samples to the console")
+    parser.add_argument("--headless", action="store_true",
+                        help="Capture and log without a plot (matplotlib is never imported)")
+    parser.add_argument("--summary-interval", type=float, default=10.0,
+                        help="Seconds between summary lines in headless mode")
+    parser.add_argument("--no-full-run", action="store_true", help="Hide the full-run overview panel")
+    parser.add_argument("--binary-log", metavar="PATH",
+                        help="Also write a chunked binary log with a session index")
+    parser.add_argument("--import-csv", metavar="CSV",
+                        help="Convert an existing data_log.csv into --binary-log and exit")
+    parser.add_argument("--port", action="append",
+                        help="Gauge serial port; repeat for several gauges (default: first detected)")
+    parser.add_argument("--all-ports", action="store_true",
+                        help="Read every detected /dev/tty.usbserial-*/usbmodem* gauge")
+    parser.add_argument("--bus", nargs="?", const="/tmp/extrusion_bus.sock", metavar="SOCKET",
+                        help="Subscribe to Acquisition_Daemon.py instead of opening ports; --port then picks "
+                             "gauges by name (default socket: /tmp/extrusion_bus.sock)")
+    parser.add_argument("--replay", metavar="LOG",
+                        help="Replay a recorded data_log.csv or binary log instead of reading a gauge")
+    parser.add_argument("--replay-speed", type=_speed, default=1.0,
+                        help="Replay speed multiplier, or 'max' (default: 1)")
+    parser.add_argument("--replay-session", type=int, default=-1,
+                        help="Session to replay, counted from 0 (default: last)")
+    parser.add_argument("--synthetic", action="store_true", help="Use generated readings instead of a gauge")
+    parser.add_argument("--rate", type=_speed, default=10.0,
+                        help="Synthetic sample rate in Hz, or 'max' (default: 10)")
+    parser.add_argument("--noise", type=float, default=0.0, help="Synthetic noise std in mm")
+    parser.add_argument("--spectrum", action="store_true",
+                        help="Show the oscillation spectrum of the last --spectrum-window samples")
+    parser.add_argument("--spectrum-window", type=int, default=1024,
+                        help="Samples in the spectrum window (default: 1024, ~100 s at 10 Hz)")
+    parser.add_argument("--pour-interval", type=float, metavar="SECONDS",
+                        help="Pellet dispenser's time between pours, flagged when it shows in the spectrum")
+    parser.add_argument("--latency", nargs="?", const="latency.csv", metavar="CSV",
+                        help="Time each pipeline stage, show p50/p99 and write histograms to CSV on exit "
+                             "(default: latency.csv)")
+    args = parser.parse_args()
+
+    if args.import_csv:
+        if not args.binary_log:
+            parser.error("--import-csv needs --binary-log")
+        try:
+            sessions, rows, skipped = convert_csv_log(args.import_csv, args.binary_log)
+        except ValueError as e:
+            print(e)
+            sys.exit(1)
+        print(f"Imported {rows} samples in {sessions} sessions into {args.binary_log}"
+              + (f" ({skipped} already there)" if skipped else ""))
+        return
+
+    probe = LatencyProbe() if args.latency else None
+    try:
+        monitors = open_monitors(args, probe)
+    except ValueError as e:  # e.g. a binary log that can't be appended to
+        print(e)
+        sys.exit(1)
+    if args.headless:
+        try:
+            run_headless(monitors, args.summary_interval, probe=probe)
+        finally:
+            for monitor in monitors:
+                monitor.close()
+            if probe:
+                dump_latency(probe, args.latency)
+        return
+
+    meter = RenderMeter() if args.perf else None
+    plot = LivePlot(monitors, renderer=args.renderer, meter=meter, full_run=not args.no_full_run,
+                    probe=probe)
+    try:
+        plot.run(args.interval)
+    finally:
+        # --- Cleanup ---
+        for monitor in monitors:
+            monitor.close()
+        if meter:
+            print(f"[perf] {args.renderer} renderer: {meter.summary()}")
+        if probe:
+            dump_latency(probe, args.latency)
 
-# --- Cleanup ---
-if ser:
-    ser.close()
+if __name__ == "__main__":
+    main()
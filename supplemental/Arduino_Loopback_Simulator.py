@@ -0,0 +1,439 @@
+import argparse
+import math
+import os
+import random
+import re
+import select
+import sys
+import time
+import tty
+
+# Pseudo-terminal stand-ins for the pellet dispenser Arduino
+# (Appendix_C_Pellet_Feeder_Serial_Communication.ino) and the Felfil
+# thickness gauge, so both GUIs can run their real serial reader, parser
+# and UI code against a "device" at rates well above production:
+#
+#   python Arduino_Loopback_Simulator.py --rate 5000 --jitter 0.3
+#   python Appendix_D_Felfil_Thickness_Gui.py --port /dev/pts/N
+#
+# and pick the dispenser's /dev/pts path in the pellet GUI's port list.
+# Linux/macOS only (needs a pty).
+
+
+# --- Pseudo-terminal port ---
+class PtyPort:
+    """Master side of a pty; the GUIs open the slave side (`path`) as a serial port
+
+    `connected` follows whether anything has the slave open, so a device
+    can reset when a GUI connects, as an Arduino does on DTR. Writes never
+    block: what the reader hasn't taken yet is kept, up to `max_pending`
+    bytes, after which the oldest output is dropped like a UART overrun
+    and counted in `dropped`.
+    """
+
+    def __init__(self, link=None, max_pending=1 << 20):
+        self.master, slave = os.openpty()
+        tty.setraw(slave)  # no echo or newline translation, like a real serial line
+        self.path = os.ttyname(slave)
+        os.close(slave)  # the master sees a hangup until a GUI opens the slave
+        os.set_blocking(self.master, False)
+        self.poller = select.poll()
+        self.poller.register(self.master, select.POLLHUP)
+        self.connected = False
+        self.link = link
+        if link:
+            if os.path.lexists(link):
+                os.remove(link)
+            os.symlink(self.path, link)
+        self.max_pending = max_pending
+        self.pending = bytearray()
+        self.sent = 0
+        self.dropped = 0
+
+    def check(self):
+        """Update `connected`; True if a GUI has just opened the port"""
+        was_connected = self.connected
+        self.connected = not self.poller.poll(0)
+        if not self.connected:
+            self.pending.clear()  # nobody listening, the bytes go nowhere
+        return self.connected and not was_connected
+
+    def fileno(self):
+        return self.master
+
+    def read(self):
+        try:
+            return os.read(self.master, 4096)
+        except BlockingIOError:
+            return b""
+        except OSError:  # EIO: the GUI closed the port
+            self.connected = False
+            self.pending.clear()
+            return b""
+
+    def write(self, data):
+        if not self.connected:
+            return
+        self.pending += data
+        overflow = len(self.pending) - self.max_pending
+        if overflow > 0:
+            del self.pending[:overflow]
+            self.dropped += overflow
+        self.flush()
+
+    def flush(self):
+        while self.pending:
+            try:
+                written = os.write(self.master, self.pending)
+            except (BlockingIOError, OSError):
+                return
+            del self.pending[:written]
+            self.sent += written
+
+    def close(self):
+        if self.link and os.path.islink(self.link):
+            os.remove(self.link)
+        os.close(self.master)
+
+
+# --- Line pacing ---
+class Pacer:
+    """Release times for a stream of `rate` lines/s
+
+    Each line is shifted by up to +/-`jitter` of a period, and every
+    `burst_every` seconds `burst` extra lines are released at once.
+    """
+
+    def __init__(self, rate, jitter=0.0, burst=0, burst_every=0.0, seed=None):
+        self.rate = rate
+        self.jitter = min(jitter, 0.5)  # keeps lines in order
+        self.burst = burst
+        self.burst_every = burst_every
+        self.rng = random.Random(seed)
+        self.start = time.monotonic()
+        self.count = 0
+        self.next_line = self._line_time(0) if rate else math.inf
+        self.next_burst = self.start + burst_every if burst and burst_every else math.inf
+
+    def _line_time(self, n):
+        offset = self.rng.uniform(-self.jitter, self.jitter) if self.jitter else 0.0
+        return self.start + (n + 1 + offset) / self.rate
+
+    def due(self, now):
+        """Number of lines to send now"""
+        count = 0
+        while self.next_line <= now:
+            count += 1
+            self.count += 1
+            self.next_line = self._line_time(self.count)
+        while self.next_burst <= now:
+            count += self.burst
+            self.next_burst += self.burst_every
+        return count
+
+    def deadline(self):
+        return min(self.next_line, self.next_burst)
+
+
+# --- Pellet dispenser firmware ---
+def _to_float(text):
+    """Arduino String.toFloat(): leading number, 0 if there isn't one"""
+    match = re.match(r"\s*[-+]?(\d+\.?\d*|\.\d+)", text)
+    return float(match.group(0)) if match else 0.0
+
+def _to_int(text):
+    match = re.match(r"\s*[-+]?\d+", text)
+    return int(match.group(0)) if match else 0
+
+class DispenserFirmware:
+    """The command set and timing of Appendix_C_Pellet_Feeder_Serial_Communication.ino
+
+    Pours block command handling for their beeps and motor steps, as on
+    the board; `time_scale` shrinks those delays (0 = instant). With
+    `weight_pacer`, "Current weight: Xg" readings are streamed too, for
+    load-testing the GUI.
+    """
+
+    CALIBRATION_STEPS = 5000
+    STEP_SECONDS = 0.0015  # 750 us high + 750 us low
+    BEEP_SECONDS = 1.25  # three 250 ms beeps and a 500 ms pause
+    BOOT_SECONDS = 0.5  # bootloader wait after the DTR reset
+
+    def __init__(self, port, time_scale=1.0, weight_pacer=None):
+        self.port = port
+        self.time_scale = time_scale
+        self.weight_pacer = weight_pacer
+        self.received = 0
+        self.reset(time.monotonic())
+
+    def reset(self, now):
+        """Power-up state; the board reboots whenever the port is opened"""
+        self.buffer = bytearray()
+        self.commands = []
+        self.outbox = []  # (send time, line), in time order
+        self.busy_until = now + self.BOOT_SECONDS
+
+        self.hopper_weight = 0.0
+        self.calibration_weight = 0.0
+        self.pour_weight = 0.0
+        self.seconds_between_pours = 0
+        self.last_pour = 0.0
+        self.total_steps_poured = 0
+        self.steps_before_refill = 0
+        self.running = False
+        self.refill_needed = False
+
+        self.println("Pellet dispenser ready", self.busy_until)
+
+    def println(self, line, at=None):
+        self.outbox.append((time.monotonic() if at is None else at, line))
+
+    def steps_per_gram(self):
+        return self.CALIBRATION_STEPS / self.calibration_weight if self.calibration_weight > 0 else 0.0
+
+    def remaining_weight(self):
+        per_gram = self.steps_per_gram()
+        poured = self.total_steps_poured / per_gram if per_gram else 0.0
+        return max(0.0, self.hopper_weight - poured)
+
+    def pour(self, now):
+        """pourPellets(): returns when the pour finishes"""
+        self.println("Pouring pellets", now)
+        pour_steps = int(self.steps_per_gram() * self.pour_weight)
+        done = now + (self.BEEP_SECONDS + pour_steps * self.STEP_SECONDS) * self.time_scale
+        self.total_steps_poured += pour_steps
+        self.steps_before_refill = int(self.steps_per_gram() * self.hopper_weight)
+        if self.total_steps_poured >= self.steps_before_refill:
+            self.refill_needed = True
+            self.running = False
+            self.println("Refill needed", done)
+        else:
+            self.println("Pour complete", done)
+        self.busy_until = done
+        return done
+
+    def handle(self, cmd, now):
+        """processCommand()"""
+        cmd = cmd.strip()
+        if cmd.startswith("cal "):
+            self.calibration_weight = _to_float(cmd[4:])
+            self.println(f"Cal weight: {self.calibration_weight:.2f}", now)
+        elif cmd.startswith("pour "):
+            self.pour_weight = _to_float(cmd[5:])
+            self.println(f"Pour weight: {self.pour_weight:.2f}", now)
+        elif cmd.startswith("time "):
+            self.seconds_between_pours = _to_int(cmd[5:])
+            self.println(f"Time: {self.seconds_between_pours}", now)
+        elif cmd.startswith("hopper "):
+            self.hopper_weight = _to_float(cmd[7:])
+            self.total_steps_poured = 0
+            self.refill_needed = False
+            self.steps_before_refill = int(self.steps_per_gram() * self.hopper_weight)
+            self.println(f"Hopper: {self.hopper_weight:.2f}g, refill at: {self.steps_before_refill}", now)
+        elif cmd == "start":
+            if self.calibration_weight > 0 and self.pour_weight > 0 and self.seconds_between_pours > 0:
+                self.running = True
+                self.last_pour = now
+                self.println("System started", now)
+            else:
+                self.println("Set all parameters first", now)
+        elif cmd == "stop":
+            self.running = False
+            self.println("System stopped", now)
+        elif cmd == "alarm_on":
+            self.println("Alarm on", now)
+        elif cmd == "alarm_off":
+            self.println("Alarm off", now)
+        elif cmd == "status":
+            self.println(f"Running:{'Y' if self.running else 'N'} Refill:{'Y' if self.refill_needed else 'N'} "
+                         f"Cal:{self.calibration_weight:.2f} Pour:{self.pour_weight:.2f} "
+                         f"Time:{self.seconds_between_pours} Hopper:{self.hopper_weight:.2f}", now)
+        elif cmd == "manual":
+            if self.calibration_weight > 0 and self.pour_weight > 0:
+                self.pour(now)
+            else:
+                self.println("Set cal and pour weight first", now)
+        elif cmd == "calibrate":
+            self.println("Calibrating...", now)
+            done = now + self.CALIBRATION_STEPS * self.STEP_SECONDS * self.time_scale
+            self.println("Weigh pellets and set cal weight", done)
+            self.busy_until = done
+        elif cmd == "help":
+            for line in ("Commands:", "cal <weight> - set calibration", "pour <weight> - set pour amount",
+                         "time <seconds> - set time between", "hopper <weight> - set hopper weight",
+                         "start/stop - control system", "manual - manual pour", "calibrate - run calibration",
+                         "status - show status", "alarm_on/alarm_off"):
+                self.println(line, now)
+        else:
+            self.println("Unknown command - type 'help'", now)
+
+    def receive(self, data):
+        """serialEvent(): collect complete command lines"""
+        self.buffer += data
+        while b"\n" in self.buffer:
+            line, _, rest = bytes(self.buffer).partition(b"\n")
+            self.buffer[:] = rest
+            self.commands.append(line.decode("ascii", errors="ignore"))
+            self.received += 1
+
+    def step(self, now):
+        """loop(): handle commands and scheduled pours unless a pour/calibration is still running"""
+        if self.port.check():
+            self.reset(now)
+        while now >= self.busy_until and self.commands:
+            self.handle(self.commands.pop(0), max(now, self.busy_until))
+        if now >= self.busy_until and self.running and not self.refill_needed:
+            if now - self.last_pour >= self.seconds_between_pours:
+                self.last_pour = self.pour(now)
+
+        lines = []
+        if self.weight_pacer:
+            weight = self.remaining_weight()
+            lines += [f"Current weight: {weight:.1f}g"] * self.weight_pacer.due(now)
+        while self.outbox and self.outbox[0][0] <= now:
+            lines.append(self.outbox.pop(0)[1])
+        if lines:
+            self.port.write("".join(f"{line}\r\n" for line in lines).encode())
+
+    def deadline(self):
+        times = [self.outbox[0][0]] if self.outbox else []
+        if self.running and not self.refill_needed:
+            times.append(max(self.busy_until, self.last_pour + self.seconds_between_pours))
+        elif self.commands:
+            times.append(self.busy_until)
+        if self.weight_pacer:
+            times.append(self.weight_pacer.deadline())
+        return min(times, default=math.inf)
+
+
+# --- Thickness gauge ---
+class ThicknessGauge:
+    """The Felfil gauge's "ms,mm" stream
+
+    Thickness is 1.75 mm plus Gaussian `noise` and an optional `wobble`
+    sine of `wobble_period` seconds; `bad_lines` is the fraction of lines
+    sent garbled.
+    """
+
+    def __init__(self, port, pacer, noise=0.01, wobble=0.0, wobble_period=10.0, bad_lines=0.0, seed=None):
+        self.port = port
+        self.pacer = pacer
+        self.noise = noise
+        self.wobble = wobble
+        self.wobble_period = wobble_period
+        self.bad_lines = bad_lines
+        self.rng = random.Random(seed)
+        self.lines = 0
+
+    def step(self, now):
+        self.port.check()
+        count = self.pacer.due(now)
+        if not count:
+            return
+        period = 1.0 / self.pacer.rate if self.pacer.rate else 0.0
+        first = self.lines
+        out = []
+        for i in range(count):
+            t = (first + i) * period
+            thickness = 1.75 + self.rng.gauss(0.0, self.noise) if self.noise else 1.75
+            if self.wobble:
+                thickness += self.wobble * math.sin(2 * math.pi * t / self.wobble_period)
+            if self.bad_lines and self.rng.random() < self.bad_lines:
+                out.append(f"{t * 1000:.0f};{thickness:.3f}x\r\n")
+            else:
+                out.append(f"{t * 1000:.0f},{thickness:.3f}\r\n")
+        self.lines += count
+        self.port.write("".join(out).encode())
+
+    def deadline(self):
+        return self.pacer.deadline()
+
+
+# --- Main loop ---
+CONNECT_POLL = 0.1  # s between checks for a GUI opening a port
+
+def run(devices, duration=None):
+    """Serve every device until Ctrl-C or `duration` seconds"""
+    ports = {device.port.fileno(): device for device in devices}
+    end = time.monotonic() + duration if duration else math.inf
+    try:
+        while True:
+            now = time.monotonic()
+            if now >= end:
+                break
+            for device in devices:
+                device.step(now)
+
+            deadline = min([end] + [device.deadline() for device in devices])
+            readers = [fd for fd, device in ports.items() if device.port.connected]
+            writers = [fd for fd in readers if ports[fd].port.pending]
+            timeout = max(0.0, min(deadline - time.monotonic(), CONNECT_POLL))
+            readable, writable, _ = select.select(readers, writers, [], timeout)
+            for fd in readable:
+                device = ports[fd]
+                if isinstance(device, DispenserFirmware):
+                    device.receive(device.port.read())
+                else:
+                    device.port.read()  # the gauge ignores input
+            for fd in writable:
+                ports[fd].port.flush()
+    except KeyboardInterrupt:
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pseudo-terminal pellet dispenser and thickness gauge simulator")
+    parser.add_argument("--no-dispenser", action="store_true", help="Don't simulate the pellet dispenser")
+    parser.add_argument("--no-thickness", action="store_true", help="Don't simulate the thickness gauge")
+    parser.add_argument("--dispenser-link", metavar="PATH", help="Symlink to the dispenser pty, e.g. /tmp/ttyDISPENSER")
+    parser.add_argument("--thickness-link", metavar="PATH", help="Symlink to the gauge pty, e.g. /tmp/ttyGAUGE")
+    parser.add_argument("--rate", type=float, default=10.0, help="Thickness lines per second (default: 10)")
+    parser.add_argument("--weight-rate", type=float, default=0.0,
+                        help="Extra 'Current weight' lines per second from the dispenser (default: none)")
+    parser.add_argument("--jitter", type=float, default=0.0,
+                        help="Timing jitter as a fraction of the line period, up to 0.5")
+    parser.add_argument("--burst", type=int, default=0, help="Extra lines sent at once every --burst-every s")
+    parser.add_argument("--burst-every", type=float, default=1.0, help="Seconds between bursts (default: 1)")
+    parser.add_argument("--noise", type=float, default=0.01, help="Thickness noise std in mm")
+    parser.add_argument("--wobble", type=float, default=0.0, help="Thickness oscillation amplitude in mm")
+    parser.add_argument("--wobble-period", type=float, default=10.0, help="Oscillation period in s")
+    parser.add_argument("--bad-lines", type=float, default=0.0, help="Fraction of garbled thickness lines")
+    parser.add_argument("--time-scale", type=float, default=1.0,
+                        help="Scale for the dispenser's pour/calibration delays (0 = instant)")
+    parser.add_argument("--duration", type=float, help="Stop after this many seconds")
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+
+    devices = []
+    if not args.no_dispenser:
+        weight_pacer = None
+        if args.weight_rate:
+            weight_pacer = Pacer(args.weight_rate, args.jitter, args.burst, args.burst_every, args.seed)
+        dispenser = DispenserFirmware(PtyPort(args.dispenser_link), args.time_scale, weight_pacer)
+        print(f"Pellet dispenser: {args.dispenser_link or dispenser.port.path}")
+        devices.append(dispenser)
+    if not args.no_thickness:
+        pacer = Pacer(args.rate, args.jitter, args.burst, args.burst_every, args.seed)
+        gauge = ThicknessGauge(PtyPort(args.thickness_link), pacer, args.noise, args.wobble,
+                               args.wobble_period, args.bad_lines, args.seed)
+        print(f"Thickness gauge:  {args.thickness_link or gauge.port.path}")
+        devices.append(gauge)
+    if not devices:
+        parser.error("nothing to simulate")
+    print("Press Ctrl-C to stop")
+    sys.stdout.flush()
+
+    start = time.monotonic()
+    run(devices, args.duration)
+    elapsed = time.monotonic() - start
+
+    for device in devices:
+        name = "dispenser" if isinstance(device, DispenserFirmware) else "gauge"
+        extra = f", {device.received} commands received" if name == "dispenser" else f", {device.lines} lines"
+        print(f"{name}: {device.port.sent} bytes sent ({device.port.sent / elapsed:.0f} B/s), "
+              f"{device.port.dropped} dropped{extra}")
+        device.port.close()
+
+
+if __name__ == "__main__":
+    main()
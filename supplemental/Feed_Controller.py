@@ -0,0 +1,345 @@
+import argparse
+import math
+import os
+import queue
+import sys
+import time
+from collections import deque
+from datetime import datetime
+
+import numpy as np
+
+from Acquisition_Daemon import BUS_SOCKET, BusClient
+from Appendix_D_Felfil_Thickness_Gui import TARGET_THICKNESS, BatchParser, LatencyProbe, load_log_session
+
+# Closed-loop feed control: reads the live thickness stream from the
+# acquisition daemon and trims the pellet dispenser's feed rate (pour
+# weight / time between pours) with `pour` and `time` commands, instead of
+# someone adjusting them by hand from the plot:
+#
+#   python Acquisition_Daemon.py --dispenser /dev/tty.usbmodem1101 --gauge /dev/tty.usbserial-1410
+#   python Feed_Controller.py --latency
+#
+# --dry-run LOG runs the same controller over a recorded data_log.csv or
+# binary log and prints the commands it would have sent. A recording
+# can't show what those commands would have done to the filament, so the
+# dry run checks the controller's timing, deadband and rate limits, not
+# its tuning.
+
+
+# --- Controller ---
+def _clamp(x, lo, hi):
+    return min(max(x, lo), hi)
+
+class FeedController:
+    """PI correction of the feed rate from filament thickness
+
+    The thickness is averaged per batch and smoothed with a `tau` s
+    exponential filter. The error is the relative cross-section shortfall
+    (target / d)^2 - 1, zero while d is within `deadband` mm of the
+    target. The PI output is a multiplier on the starting feed rate,
+    clamped to [min_scale, max_scale]. Commands go out at most every
+    `min_interval` s, and each one moves the multiplier by at most
+    `max_step`. All timing uses the gauge's own clock, so recorded logs
+    replay exactly.
+
+    The pour weight carries the correction. `time` only changes when the
+    pour weight would leave `pour_limits`; the firmware takes whole
+    seconds.
+    """
+
+    def __init__(self, pour, time_between, target=TARGET_THICKNESS, deadband=0.02, kp=0.5, ki=0.005,
+                 tau=5.0, max_step=0.05, min_scale=0.5, max_scale=1.5, min_interval=10.0,
+                 pour_limits=(0.5, 50.0), time_limits=(5, 600)):
+        self.base_feed = pour / time_between  # g/s
+        self.pour = pour
+        self.time_between = int(time_between)
+        self.target = target
+        self.deadband = deadband
+        self.kp = kp
+        self.ki = ki
+        self.tau = tau
+        self.max_step = max_step
+        self.min_scale = min_scale
+        self.max_scale = max_scale
+        self.min_interval = min_interval
+        self.pour_limits = pour_limits
+        self.time_limits = time_limits
+
+        self.scale = 1.0
+        self.integral = 0.0
+        self.smoothed = None
+        self.error = 0.0
+        self.last_t = None
+        self.last_decision = None
+
+    def _error(self):
+        if abs(self.smoothed - self.target) <= self.deadband or self.smoothed <= 0:
+            return 0.0
+        return (self.target / self.smoothed) ** 2 - 1.0
+
+    def update(self, times, values, active=True):
+        """Feed a batch of (gauge ms, mm) samples
+
+        Returns None between decisions, else the list of commands to send
+        (empty if the feed rate stays put). While not `active` (dispenser
+        stopped) the filter keeps running but nothing accumulates or is sent.
+        """
+        if not len(values):
+            return None
+        t = float(times[-1]) / 1000.0
+        mean = float(np.mean(values))
+        if self.smoothed is None or self.last_t is None or t < self.last_t:  # first batch or gauge reset
+            # A reset gauge clock restarts from zero, so the old decision time
+            # and accumulated error no longer apply
+            self.smoothed = mean
+            self.last_t = t
+            self.last_decision = None
+            self.integral = 0.0
+            return None
+        dt = t - self.last_t
+        self.last_t = t
+        self.smoothed += (1.0 - math.exp(-dt / self.tau)) * (mean - self.smoothed)
+        self.error = self._error()
+        if not active:
+            return None
+
+        # Integrate unless the output is already pinned in the error's direction (anti-windup)
+        output = 1.0 + self.kp * self.error + self.ki * self.integral
+        if not ((output >= self.max_scale and self.error > 0) or (output <= self.min_scale and self.error < 0)):
+            self.integral += self.error * dt
+
+        if self.last_decision is not None and t - self.last_decision < self.min_interval:
+            return None
+        self.last_decision = t
+        wanted = _clamp(1.0 + self.kp * self.error + self.ki * self.integral, self.min_scale, self.max_scale)
+        scale = self.scale + _clamp(wanted - self.scale, -self.max_step, self.max_step)
+        return self._commands(scale)
+
+    def _commands(self, scale):
+        feed = self.base_feed * scale
+        time_between = self.time_between
+        pour = feed * time_between
+        lo, hi = self.pour_limits
+        if not lo <= pour <= hi:
+            time_between = int(_clamp(round(_clamp(pour, lo, hi) / feed), *self.time_limits))
+            pour = _clamp(feed * time_between, lo, hi)
+        pour = round(pour, 2)  # the firmware echoes two decimals
+
+        commands = []
+        if time_between != self.time_between:
+            commands.append(f"time {time_between}")
+        if pour != round(self.pour, 2):
+            commands.append(f"pour {pour:.2f}")
+        if commands:
+            self.scale = scale
+            self.pour = pour
+            self.time_between = time_between
+        return commands
+
+
+class DecisionLog:
+    """CSV of every controller decision"""
+
+    def __init__(self, path):
+        self.file = open(path, "w") if path else None
+        if self.file:
+            self.file.write("time_s,thickness_mm,error,integral,scale,pour_g,time_s_between,commands\n")
+
+    def write(self, controller, commands):
+        if self.file:
+            c = controller
+            self.file.write(f"{c.last_t:.3f},{c.smoothed:.4f},{c.error:.5f},{c.integral:.4f},{c.scale:.4f},"
+                            f"{c.pour:.2f},{c.time_between},{';'.join(commands)}\n")
+
+    def close(self):
+        if self.file:
+            self.file.close()
+
+
+# --- Dry run ---
+def dry_run(path, controller, session=-1, batch=1.0, log=None, probe=None):
+    """Run the controller over a recorded session in `batch` s slices of gauge time"""
+    _, lines = load_log_session(path, session)
+    times, values, _ = BatchParser().feed(b"".join(lines))
+    if not len(times):
+        print(f"No samples in {path}")
+        return 0
+    print(f"→ Dry run over {len(times)} samples ({(times[-1] - times[0]) / 1000:.0f} s) from {path}")
+
+    edges = np.arange(times[0], times[-1] + batch * 1000.0, batch * 1000.0)
+    bounds = np.searchsorted(times, edges, side="right")
+    sent = 0
+    start = 0
+    for stop in bounds.tolist():
+        if stop == start:
+            continue
+        begin = time.perf_counter()
+        commands = controller.update(times[start:stop], values[start:stop])
+        if probe:
+            probe.record("decide", time.perf_counter() - begin)
+        start = stop
+        if commands is None:
+            continue
+        log.write(controller, commands)
+        if commands:
+            sent += len(commands)
+            print(f"[{controller.last_t:9.1f} s] d={controller.smoothed:.3f} mm scale={controller.scale:.3f} "
+                  f"→ {', '.join(commands)}")
+    print(f"{sent} commands; final pour {controller.pour:.2f} g every {controller.time_between} s "
+          f"(feed x{controller.scale:.3f})")
+    return sent
+
+
+# --- Live control ---
+# Seconds to wait for the firmware to echo a pour/time command before
+# giving up on it (as CommandWriter's COMMAND_TIMEOUT in Appendix C), so one
+# lost reply can't shift every later match
+REPLY_TIMEOUT = 2.0
+
+def _pick(devices, topic, name):
+    names = [device for device, device_topic in devices.items() if device_topic == topic]
+    if name:
+        return name if name in names else None
+    return names[0] if names else None
+
+def run_live(args, log, probe, summary_interval=30.0):
+    """Control the dispenser from the gauge until Ctrl-C
+
+    "Sensor to command" is from the arrival at the daemon of the thickness
+    batch that triggered a command to handing that command to the daemon;
+    "sensor to reply" runs on to the arrival of the firmware's echo.
+    """
+    events = queue.Queue()
+    try:
+        client = BusClient(args.bus, topics=("thickness", "dispenser"), on_event=events.put)
+    except OSError as e:
+        print(f"Failed to reach the acquisition daemon on {args.bus}: {e}")
+        sys.exit(1)
+    gauge = _pick(client.devices, "thickness", args.gauge)
+    dispenser = _pick(client.devices, "dispenser", args.dispenser)
+    if not gauge or not dispenser:
+        print(f"Need a gauge and a dispenser on {args.bus}, found {client.devices or 'nothing'}")
+        client.close()
+        sys.exit(1)
+    print(f"→ Controlling {dispenser} from {gauge}, press Ctrl-C to stop")
+
+    controller = None
+    if args.pour and args.time:
+        controller = make_controller(args, args.pour, args.time)
+    running = False
+    awaiting = deque()  # (command, arrival of the triggering batch, monotonic time sent), oldest first
+    client.start()
+    client.send(dispenser, "status")  # current settings and whether it's running
+
+    next_summary = time.monotonic() + summary_interval
+    try:
+        while True:
+            try:
+                event = events.get(timeout=1.0)
+            except queue.Empty:
+                event = False
+            if event is None:
+                print("Acquisition daemon went away")
+                break
+            now = time.monotonic()
+            while awaiting and now - awaiting[0][2] >= REPLY_TIMEOUT:
+                command, _, _ = awaiting.popleft()
+                print(f"[{datetime.now():%H:%M:%S}] No reply to '{command}' after {REPLY_TIMEOUT:g} s")
+
+            if event and event["topic"] == "dispenser" and event["device"] == dispenser:
+                if event["kind"] == "state":
+                    running = event["value"]
+                elif event["kind"] == "refill":
+                    running = False  # the firmware stops itself
+                elif event["kind"] == "status":
+                    status = event["value"]
+                    running = status["running"]
+                    if controller is None and status.get("pour") and status.get("time"):
+                        controller = make_controller(args, status["pour"], status["time"])
+                        print(f"Starting from pour {controller.pour:.2f} g every {controller.time_between} s")
+                elif event["kind"] == "setting":
+                    for i, (command, triggered, _) in enumerate(awaiting):
+                        if command.split(" ", 1)[0] == event["value"][0]:
+                            del awaiting[i]
+                            if probe:
+                                probe.record("sensor_to_reply", event["t"] - triggered)
+                            break
+
+            elif event and event["topic"] == "thickness" and event["device"] == gauge and controller:
+                commands = controller.update(np.array(event["times"]), np.array(event["values"]),
+                                             active=running)
+                if commands is not None:
+                    log.write(controller, commands)
+                for command in commands or ():
+                    client.send(dispenser, command)
+                    if probe:
+                        probe.record("sensor_to_command", time.monotonic() - event["t"])
+                    awaiting.append((command, event["t"], time.monotonic()))
+                    print(f"[{datetime.now():%H:%M:%S}] d={controller.smoothed:.3f} mm scale={controller.scale:.3f} "
+                          f"→ {command}")
+
+            if time.monotonic() >= next_summary:
+                if controller:
+                    print(f"[{datetime.now():%H:%M:%S}] d={controller.smoothed:.3f} mm error={controller.error:+.4f} "
+                          f"feed x{controller.scale:.3f} ({'running' if running else 'stopped'})")
+                if probe:
+                    print(probe.format())
+                next_summary += summary_interval
+    except KeyboardInterrupt:
+        pass
+    client.close()
+
+def make_controller(args, pour, time_between):
+    return FeedController(pour, time_between, target=args.target, deadband=args.deadband, kp=args.kp,
+                          ki=args.ki, tau=args.tau, max_step=args.max_step, min_scale=args.min_scale,
+                          max_scale=args.max_scale, min_interval=args.min_interval)
+
+def main():
+    parser = argparse.ArgumentParser(description="Closed-loop pellet feed control from filament thickness")
+    parser.add_argument("--bus", default=BUS_SOCKET, metavar="SOCKET",
+                        help=f"Acquisition daemon socket (default: {BUS_SOCKET})")
+    parser.add_argument("--gauge", help="Gauge to follow (default: the daemon's first)")
+    parser.add_argument("--dispenser", help="Dispenser to command (default: the daemon's first)")
+    parser.add_argument("--dry-run", metavar="LOG", help="Run over a recorded log instead of the live line")
+    parser.add_argument("--session", type=int, default=-1, help="Dry-run session, counted from 0 (default: last)")
+    parser.add_argument("--pour", type=float, help="Starting pour weight in g (default: from the dispenser; "
+                                                   "5 in a dry run)")
+    parser.add_argument("--time", type=int, help="Starting seconds between pours (default: from the "
+                                                 "dispenser; 30 in a dry run)")
+    parser.add_argument("--target", type=float, default=TARGET_THICKNESS, help="Target thickness in mm")
+    parser.add_argument("--deadband", type=float, default=0.02, help="No correction within this many mm")
+    parser.add_argument("--kp", type=float, default=0.5, help="Proportional gain (feed fraction per unit error)")
+    parser.add_argument("--ki", type=float, default=0.005, help="Integral gain (per unit error second)")
+    parser.add_argument("--tau", type=float, default=5.0, help="Thickness smoothing time constant in s")
+    parser.add_argument("--max-step", type=float, default=0.05, help="Largest feed change per command, "
+                                                                     "as a fraction (default: 0.05)")
+    parser.add_argument("--min-scale", type=float, default=0.5, help="Lowest feed multiplier")
+    parser.add_argument("--max-scale", type=float, default=1.5, help="Highest feed multiplier")
+    parser.add_argument("--min-interval", type=float, default=10.0, help="Seconds between commands")
+    parser.add_argument("--log", metavar="CSV", help="Write every decision to this CSV")
+    parser.add_argument("--latency", nargs="?", const="controller_latency.csv", metavar="CSV",
+                        help="Measure sensor-to-command latency and write histograms on exit "
+                             "(default: controller_latency.csv)")
+    args = parser.parse_args()
+
+    probe = LatencyProbe() if args.latency else None
+    log = DecisionLog(args.log)
+    try:
+        if args.dry_run:
+            if not os.path.exists(args.dry_run):
+                parser.error(f"{args.dry_run} not found")
+            controller = make_controller(args, args.pour or 5.0, args.time or 30)
+            dry_run(args.dry_run, controller, args.session, log=log, probe=probe)
+        else:
+            run_live(args, log, probe)
+    finally:
+        log.close()
+        if probe:
+            print(probe.format())
+            probe.dump_csv(args.latency)
+            print(f"Latency histograms written to {args.latency}")
+
+
+if __name__ == "__main__":
+    main()
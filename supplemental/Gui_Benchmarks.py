@@ -0,0 +1,621 @@
+import argparse
+import json
+import os
+import platform
+import queue
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+import serial
+
+# Both GUIs live next to this file
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# Firmware output from Appendix_C_Pellet_Feeder_Serial_Communication.ino, plus
+# the weight/pour formats PelletDispenserGUI also understands, with the
+# (kind, value) event parse_response() should produce for each
+PARSER_CORPUS = [
+    ("Pellet dispenser ready", ("ready", None)),
+    ("Cal weight: 12.50", ("setting", ("cal", 12.5))),
+    ("Pour weight: 5.00", ("setting", ("pour", 5.0))),
+    ("Time: 30", ("setting", ("time", 30.0))),
+    ("Hopper: 100.00g, refill at: 40000", ("setting", ("hopper", 100.0))),
+    ("System started", ("state", True)),
+    ("Set all parameters first", None),
+    ("Pouring pellets", None),
+    ("Pour complete", ("pour", None)),
+    ("Current weight: 85.0g", ("weight", 85.0)),
+    ("Poured: 5.0g", ("pour", 5.0)),
+    ("Dispensed: 4.8g", ("pour", 4.8)),
+    ("Remaining: 80.2g", ("weight", 80.2)),
+    ("Refill needed", ("refill", None)),
+    ("Running:Y Refill:N Cal:12.50 Pour:5.00 Time:30 Hopper:100.00",
+     ("status", {"running": True, "refill": False, "cal": 12.5, "pour": 5.0, "time": 30.0, "hopper": 100.0})),
+    ("Running:N Refill:Y Cal:0.00 Pour:0.00 Time:0 Hopper:0.00",
+     ("status", {"running": False, "refill": True, "cal": 0.0, "pour": 0.0, "time": 0.0, "hopper": 0.0})),
+    ("System stopped", ("state", False)),
+    ("Alarm on", None),
+    ("Alarm off", None),
+    ("Calibrating...", None),
+    ("Weigh pellets and set cal weight", None),
+    ("Set cal and pour weight first", None),
+    ("Unknown command - type 'help'", None),
+]
+FIRMWARE_MESSAGES = [message for message, _ in PARSER_CORPUS]
+
+
+# --- Thickness pipeline (Appendix D) ---
+def bench_thickness_rate(rate, duration, interval, workdir, render=True):
+    """Run the thickness pipeline in real time against a synthetic gauge at `rate` Hz
+
+    Every `interval` seconds one frame does what the live plot does:
+    parse everything that arrived, update stats, log it and (with
+    `render`) run a blitted render step on the Agg backend. A sample's
+    latency is from when the synthetic gauge produced it to the end of the
+    frame that processed it.
+    """
+    import Appendix_D_Felfil_Thickness_Gui as felfil
+
+    source = felfil.SyntheticSource(rate=rate, noise=0.02, max_batch=10**9)
+    monitor = felfil.ThicknessMonitor(source, os.path.join(workdir, f"bench_{rate:g}.csv"), echo=False)
+    plot = None
+    if render:
+        plot = felfil.LivePlot(monitor, renderer="blit")
+        plot.fig.canvas.draw()
+        plot.init()
+
+    latencies = []
+    frame_times = []
+    processed = 0
+    start = source._t0
+    next_frame = time.monotonic()
+    try:
+        while time.monotonic() - start < duration:
+            now = time.monotonic()
+            if now < next_frame:
+                time.sleep(next_frame - now)
+            next_frame += interval
+
+            frame_start = time.perf_counter()
+            if plot:
+                for artist in plot.update(0):
+                    artist.axes.draw_artist(artist)
+                new = monitor.stats.count - processed
+            else:
+                new = monitor.poll()
+            frame_end = time.monotonic()
+            frame_times.append(time.perf_counter() - frame_start)
+
+            if new:
+                produced = start + np.arange(processed + 1, processed + new + 1) / rate
+                latencies.append(frame_end - produced)
+                processed += new
+        elapsed = time.monotonic() - start
+    finally:
+        monitor.close()
+        if plot:
+            import matplotlib.pyplot as plt
+            plt.close(plot.fig)
+
+    latencies = np.concatenate(latencies) if latencies else np.empty(0)
+    offered = rate * elapsed
+    return {
+        "input_rate": rate,
+        "duration_s": elapsed,
+        "samples": processed,
+        "samples_per_s": processed / elapsed,
+        "kept_up": processed >= 0.95 * offered - rate * interval,
+        "latency_p50_ms": float(np.percentile(latencies, 50) * 1000) if len(latencies) else None,
+        "latency_p99_ms": float(np.percentile(latencies, 99) * 1000) if len(latencies) else None,
+        "frame_p50_ms": float(np.percentile(frame_times, 50) * 1000),
+        "frame_max_ms": float(np.max(frame_times) * 1000),
+    }
+
+
+def bench_thickness_parser(lines=200000):
+    """Raw BatchParser throughput on one large buffer"""
+    import Appendix_D_Felfil_Thickness_Gui as felfil
+
+    data = "".join(f"{i * 10},{1.75 + 0.001 * (i % 50):.3f}\n" for i in range(lines)).encode()
+    parser = felfil.BatchParser()
+    start = time.perf_counter()
+    parser.feed(data)
+    elapsed = time.perf_counter() - start
+    return {"lines": lines, "lines_per_s": lines / elapsed}
+
+
+def bench_spectrum(windows=(256, 1024, 4096), batches=(1, 10, 64, 1000), frames=200):
+    """SpectrumAnalyzer update + spectrum + peak search per frame"""
+    import Appendix_D_Felfil_Thickness_Gui as felfil
+
+    rng = np.random.default_rng(0)
+    results = []
+    for window in windows:
+        for batch in batches:
+            n = window + batch * frames
+            times = np.arange(n) * 100.0
+            values = 1.75 + 0.02 * np.sin(2 * np.pi * times / 30000.0) + 0.005 * rng.standard_normal(n)
+            spectrum = felfil.SpectrumAnalyzer(window, pour_interval=30)
+            spectrum.extend(times[:window], values[:window])
+            frame_times = []
+            for i in range(window, n, batch):
+                start = time.perf_counter()
+                spectrum.extend(times[i:i + batch], values[i:i + batch])
+                spectrum.dominant()
+                frame_times.append(time.perf_counter() - start)
+            results.append({
+                "window": window,
+                "batch": batch,
+                "frame_p50_ms": float(np.percentile(frame_times, 50) * 1000),
+                "frame_max_ms": float(np.max(frame_times) * 1000),
+            })
+    return results
+
+
+# --- Pellet dispenser (Appendix C) ---
+class _NullWidget:
+    """Stand-in for a Tk widget when there is no display; remembers config() options"""
+
+    def __init__(self):
+        self._options = {}
+
+    def config(self, **options):
+        self._options.update(options)
+
+    configure = config
+
+    def cget(self, option):
+        return self._options.get(option, "")
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: None
+
+
+class _HeadlessRoot:
+    """Tcl interpreter standing in for tk.Tk(): real after()/update(), no-op window calls
+
+    Without Tk there is no mainloop to marshal other threads' after()
+    calls, so those are queued and run by pump() on the main thread.
+    """
+
+    def __init__(self):
+        import tkinter as tk
+
+        self.tcl = tk.Tcl()
+        tk._default_root = self.tcl  # lets the GUI's Tk variables attach to the interpreter
+        self._main_thread = threading.current_thread()
+        self._calls = queue.Queue()
+
+    def after(self, ms, func=None, *args):
+        if threading.current_thread() is not self._main_thread:
+            self._calls.put((func, args))
+            return None
+        return self.tcl.after(ms, func, *args)
+
+    def pump(self, timeout=0.01):
+        """Run queued cross-thread callbacks and pending Tcl events"""
+        try:
+            func, args = self._calls.get(timeout=timeout)
+            func(*args)
+            while True:
+                func, args = self._calls.get_nowait()
+                func(*args)
+        except queue.Empty:
+            pass
+        self.tcl.update()
+
+    def __getattr__(self, name):
+        if name in ("title", "geometry", "protocol", "columnconfigure", "rowconfigure", "destroy"):
+            return lambda *args, **kwargs: None
+        return getattr(self.tcl, name)
+
+
+def make_headless_dispenser():
+    """PelletDispenserGUI on a Tcl interpreter (no display) with stand-in widgets
+
+    Tcl alone provides after(), update() and the Tk variables; widget
+    calls go to _NullWidget, so this measures the Python side of the
+    serial -> dispatch -> parse path rather than Tk drawing.
+    """
+    import Appendix_C_Pellet_Dispenser_Gui as dispenser
+
+    class HeadlessDispenser(dispenser.PelletDispenserGUI):
+        def setup_gui(self):
+            self.parsed = 0
+            self.parse_times = []
+            self.create_hopper_items()
+            self.state.subscribe(("hopper_weight", "hopper_max"), self.draw_hopper)
+            self.bind_state()
+
+        def __getattr__(self, name):
+            if name.startswith("__"):
+                raise AttributeError(name)
+            widget = _NullWidget()
+            setattr(self, name, widget)
+            return widget
+
+        def parse_arduino_response(self, response):
+            super().parse_arduino_response(response)
+            self.parsed += 1
+            self.parse_times.append(time.perf_counter())
+
+    root = _HeadlessRoot()
+    return root, HeadlessDispenser(root)
+
+
+def bench_dispenser_parse(repeat=2000):
+    """parse_arduino_response alone over the firmware message corpus"""
+    root, gui = make_headless_dispenser()
+    gui.pour_weight.set("5.0")
+    gui.time_between.set("30")
+    messages = FIRMWARE_MESSAGES * repeat
+    start = time.perf_counter()
+    for message in messages:
+        gui.parse_arduino_response(message)
+    elapsed = time.perf_counter() - start
+    root.update()
+    return {"messages": len(messages), "messages_per_s": len(messages) / elapsed}
+
+
+def _connect_pty(gui):
+    """Point the GUI at a pseudo-terminal and start its reader thread; return (master, slave, reader)"""
+    import pty
+
+    master, slave = pty.openpty()
+    gui.serial_port = serial.Serial(os.ttyname(slave), 9600, timeout=1)
+    gui.connected = True
+    gui.running = True
+    reader = threading.Thread(target=gui.read_serial_data, daemon=True)
+    reader.start()
+    return master, slave, reader
+
+
+def _disconnect_pty(gui, master, slave, reader):
+    gui.running = False
+    gui.connected = False
+    reader.join(timeout=2)
+    gui.serial_port.close()
+    os.close(master)
+    os.close(slave)
+
+
+def _legacy_parse(response, pour_weight="5.0"):
+    """The substring chain parse_arduino_response used before parse_response(), for comparison"""
+    if "System started" in response:
+        return ("state", True)
+    elif "System stopped" in response:
+        return ("state", False)
+    elif "Refill needed" in response or "Refill Required" in response:
+        return ("refill", None)
+    elif "Refill:N" in response:
+        return ("status", None)
+    elif any(keyword in response.lower() for keyword in ["poured:", "dispensed:", "pour complete", "manual pour"]):
+        response_lower = response.lower()
+        if "poured:" in response_lower:
+            return ("pour", float(response.split("Poured:")[1].split("g")[0].strip()))
+        elif "dispensed:" in response_lower:
+            return ("pour", float(response.split("Dispensed:")[1].split("g")[0].strip()))
+        return ("pour", float(pour_weight))
+    elif any(keyword in response.lower() for keyword in ["current weight:", "weight:", "remaining:"]):
+        response_lower = response.lower()
+        try:
+            if "current weight:" in response_lower:
+                return ("weight", float(response.split("Current weight:")[1].split("g")[0].strip()))
+            elif "weight:" in response_lower:
+                return ("weight", float(response.split("weight:")[1].split("g")[0].strip()))
+            elif "remaining:" in response_lower:
+                return ("weight", float(response.split("remaining:")[1].split("g")[0].strip()))
+        except (ValueError, IndexError):
+            return ("weight", None)
+    elif any(keyword in response.lower() for keyword in ["next pour in", "time remaining", "countdown"]):
+        return ("timing", None)
+    return None
+
+
+def bench_dispenser_parser(repeat=5000):
+    """parse_response() against PARSER_CORPUS, and its speed against the old substring chain"""
+    import Appendix_C_Pellet_Dispenser_Gui as dispenser
+
+    mismatches = []
+    for message, expected in PARSER_CORPUS:
+        event = dispenser.parse_response(message)
+        if event != expected:
+            mismatches.append({"message": message, "expected": expected, "got": event})
+
+    messages = FIRMWARE_MESSAGES * repeat
+    timings = {}
+    for name, parse in (("legacy", _legacy_parse), ("table", dispenser.parse_response)):
+        start = time.perf_counter()
+        for message in messages:
+            parse(message)
+        timings[name] = (time.perf_counter() - start) / len(messages)
+    return {
+        "corpus": len(PARSER_CORPUS),
+        "mismatches": mismatches,
+        "legacy_us_per_message": timings["legacy"] * 1e6,
+        "table_us_per_message": timings["table"] * 1e6,
+        "speedup": timings["legacy"] / timings["table"],
+    }
+
+
+def bench_dispenser_serial(messages=5000, timeout=60.0):
+    """read_serial_data -> parse_arduino_response end to end over a pseudo-terminal"""
+    root, gui = make_headless_dispenser()
+    gui.pour_weight.set("5.0")
+    gui.time_between.set("30")
+
+    payload = [f"{FIRMWARE_MESSAGES[i % len(FIRMWARE_MESSAGES)]}\r\n".encode() for i in range(messages)]
+
+    def feed():
+        for message in payload:
+            os.write(master, message)
+
+    start = time.perf_counter()
+    master, slave, reader = _connect_pty(gui)
+    writer = threading.Thread(target=feed, daemon=True)
+    writer.start()
+    while gui.parsed < messages and time.perf_counter() - start < timeout:
+        root.pump()
+    elapsed = time.perf_counter() - start
+
+    _disconnect_pty(gui, master, slave, reader)
+    return {
+        "messages": messages,
+        "parsed": gui.parsed,
+        "messages_per_s": gui.parsed / elapsed,
+        "timed_out": gui.parsed < messages,
+    }
+
+
+def bench_dispenser_latency(messages=100, spacing=0.1, idle=2.0):
+    """Message-to-GUI latency for single lines, and process CPU while the port is idle"""
+    root, gui = make_headless_dispenser()
+    master, slave, reader = _connect_pty(gui)
+
+    latencies = []
+    for i in range(messages):
+        message = FIRMWARE_MESSAGES[i % len(FIRMWARE_MESSAGES)]
+        sent = time.perf_counter()
+        os.write(master, f"{message}\r\n".encode())
+        deadline = sent + 1.0
+        while gui.parsed <= i and time.perf_counter() < deadline:
+            root.pump(timeout=0.001)
+        if gui.parsed > i:
+            latencies.append(gui.parse_times[i] - sent)
+        time.sleep(spacing)
+
+    # Nothing arrives here, so any CPU time is the reader polling
+    cpu_start = time.process_time()
+    time.sleep(idle)
+    idle_cpu = 100.0 * (time.process_time() - cpu_start) / idle
+
+    _disconnect_pty(gui, master, slave, reader)
+    return {
+        "messages": messages,
+        "received": len(latencies),
+        "latency_p50_ms": float(np.percentile(latencies, 50) * 1000) if latencies else None,
+        "latency_p99_ms": float(np.percentile(latencies, 99) * 1000) if latencies else None,
+        "idle_cpu_percent": idle_cpu,
+    }
+
+
+def _firmware_reply(command):
+    """What Appendix_C_Pellet_Feeder_Serial_Communication.ino prints for a command"""
+    name, _, value = command.partition(" ")
+    if name == "cal":
+        return f"Cal weight: {float(value):.2f}"
+    if name == "pour":
+        return f"Pour weight: {float(value):.2f}"
+    if name == "time":
+        return f"Time: {int(float(value))}"
+    if name == "hopper":
+        return f"Hopper: {float(value):.2f}g, refill at: {int(float(value) * 400)}"
+    if name == "status":
+        return "Running:N Refill:N Cal:12.50 Pour:5.00 Time:30 Hopper:100.00"
+    if name == "start":
+        return "System started"
+    if name == "stop":
+        return "System stopped"
+    return "Unknown command - type 'help'"
+
+
+def bench_dispenser_commands(rounds=100, timeout=30.0):
+    """CommandWriter round trips against a pty that answers like the firmware
+
+    Each round queues a burst of three "pour" settings (two of which should
+    be coalesced), a "status" and an unknown command.
+    """
+    import Appendix_C_Pellet_Dispenser_Gui as dispenser
+
+    root, gui = make_headless_dispenser()
+    master, slave, reader = _connect_pty(gui)
+    timeouts = []
+    gui.command_writer = dispenser.CommandWriter(gui.serial_port, on_timeout=timeouts.append)
+    gui.command_writer.start()
+    rtts = []
+    match_reply = gui.command_writer.match_reply
+
+    def record(line, arrival):
+        reply = match_reply(line, arrival)
+        if reply:
+            rtts.append(reply[1])
+        return reply
+
+    gui.command_writer.match_reply = record
+
+    def respond():
+        buffer = b""
+        while True:
+            try:
+                data = os.read(master, 4096)
+            except OSError:
+                return
+            buffer += data
+            while b"\n" in buffer:
+                line, buffer = buffer.split(b"\n", 1)
+                os.write(master, f"{_firmware_reply(line.decode().strip())}\r\n".encode())
+
+    threading.Thread(target=respond, daemon=True).start()
+
+    start = time.perf_counter()
+    for i in range(rounds):
+        for command in (f"pour {i}.1", f"pour {i}.2", f"pour {i}.3", "status", "bogus"):
+            gui.command_writer.send(command)
+        while len(rtts) + len(timeouts) < 3 * (i + 1) and time.perf_counter() - start < timeout:
+            root.pump(timeout=0.001)
+    elapsed = time.perf_counter() - start
+
+    gui.command_writer.stop()
+    _disconnect_pty(gui, master, slave, reader)
+    return {
+        "commands": 5 * rounds,
+        "written": 5 * rounds - gui.command_writer.coalesced,
+        "acknowledged": len(rtts),
+        "timeouts": len(timeouts),
+        "rtt_p50_ms": float(np.percentile(rtts, 50) * 1000) if rtts else None,
+        "rtt_p99_ms": float(np.percentile(rtts, 99) * 1000) if rtts else None,
+        "elapsed_s": elapsed,
+    }
+
+
+def bench_bus(events=2000, batch=50, workdir=None):
+    """Acquisition daemon fan-out: one subscriber keeping up, one not reading at all
+
+    Events of `batch` thickness samples are published as fast as possible;
+    the stalled subscriber should only cost its own dropped events, never
+    publish() time or the live subscriber's samples.
+    """
+    import Acquisition_Daemon as bus
+
+    path = os.path.join(workdir or tempfile.gettempdir(), "bench_bus.sock")
+    daemon = bus.AcquisitionDaemon(path, max_buffer=1024 * 1024)
+    daemon.devices["gauge"] = type("Gauge", (), {"topic": "thickness", "stop": lambda self: None})()
+    server = threading.Thread(target=daemon.serve, daemon=True)
+    server.start()
+    while not os.path.exists(path):
+        time.sleep(0.01)
+
+    latencies = []
+    received = []
+
+    def on_event(event):
+        if event:
+            latencies.append(time.monotonic() - event["t"])
+            received.append(len(event["times"]))
+
+    live = bus.BusClient(path, topics=("thickness",), on_event=on_event)
+    live.start()
+    stalled = bus.BusClient(path, topics=("thickness",))  # never started, so never reads
+
+    publish_times = []
+    values = [1.75] * batch
+    for i in range(events):
+        times = list(range(i * batch, (i + 1) * batch))
+        start = time.perf_counter()
+        daemon.publish({"topic": "thickness", "device": "gauge", "t": time.monotonic(),
+                        "times": times, "values": values})
+        publish_times.append(time.perf_counter() - start)
+
+    deadline = time.perf_counter() + 5.0
+    while len(received) < events and time.perf_counter() < deadline:
+        time.sleep(0.01)
+    dropped = sum(subscriber.dropped for subscriber in daemon.subscribers.values())
+
+    live.close()
+    stalled.close()
+    daemon.stop()
+    server.join(timeout=2)
+    return {
+        "events": events,
+        "samples": events * batch,
+        "received": sum(received),
+        "publish_max_ms": max(publish_times) * 1000,
+        "latency_p50_ms": float(np.percentile(latencies, 50) * 1000) if latencies else None,
+        "latency_p99_ms": float(np.percentile(latencies, 99) * 1000) if latencies else None,
+        "stalled_dropped": dropped,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Throughput/latency benchmarks for the thickness and pellet GUIs")
+    parser.add_argument("--rates", type=float, nargs="+", default=[100, 1000, 10000, 100000],
+                        help="Thickness input rates to test, samples/s")
+    parser.add_argument("--duration", type=float, default=3.0, help="Seconds per thickness rate")
+    parser.add_argument("--interval", type=float, default=0.1, help="Frame interval in seconds")
+    parser.add_argument("--no-render", action="store_true", help="Leave the matplotlib render step out")
+    parser.add_argument("--skip-thickness", action="store_true")
+    parser.add_argument("--skip-dispenser", action="store_true")
+    parser.add_argument("--skip-bus", action="store_true")
+    parser.add_argument("--output", help="Write results as JSON to this file (default: stdout)")
+    args = parser.parse_args()
+
+    if not args.no_render:
+        import matplotlib
+        matplotlib.use("Agg")  # no display needed
+
+    results = {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+    }
+
+    if not args.skip_thickness:
+        with tempfile.TemporaryDirectory() as workdir:
+            thickness = []
+            for rate in args.rates:
+                result = bench_thickness_rate(rate, args.duration, args.interval, workdir,
+                                              render=not args.no_render)
+                print(f"thickness @ {rate:>9g}/s: {result['samples_per_s']:>10.0f} samples/s, "
+                      f"p50 {result['latency_p50_ms']:.1f} ms, p99 {result['latency_p99_ms']:.1f} ms"
+                      f"{'' if result['kept_up'] else '  (fell behind)'}", file=sys.stderr)
+                thickness.append(result)
+        results["thickness"] = {"pipeline": thickness, "parser": bench_thickness_parser(),
+                                "spectrum": bench_spectrum()}
+        worst = max(results["thickness"]["spectrum"], key=lambda r: r["frame_max_ms"])
+        print(f"spectrum: worst frame {worst['frame_max_ms']:.2f} ms "
+              f"(window {worst['window']}, {worst['batch']} samples/frame)", file=sys.stderr)
+
+    if not args.skip_dispenser:
+        results["dispenser"] = {
+            "parser": bench_dispenser_parser(),
+            "parse": bench_dispenser_parse(),
+            "serial": bench_dispenser_serial(),
+            "latency": bench_dispenser_latency(),
+            "commands": bench_dispenser_commands(),
+        }
+        latency = results["dispenser"]["latency"]
+        print(f"dispenser: parse {results['dispenser']['parse']['messages_per_s']:.0f} msg/s, "
+              f"serial {results['dispenser']['serial']['messages_per_s']:.0f} msg/s, "
+              f"latency p50 {latency['latency_p50_ms']:.1f} ms, idle CPU {latency['idle_cpu_percent']:.1f}%",
+              file=sys.stderr)
+        parser = results["dispenser"]["parser"]
+        print(f"dispenser parser: {parser['speedup']:.1f}x faster than the substring chain, "
+              f"{len(parser['mismatches'])}/{parser['corpus']} corpus mismatches", file=sys.stderr)
+        commands = results["dispenser"]["commands"]
+        print(f"dispenser commands: {commands['written']}/{commands['commands']} written, "
+              f"{commands['acknowledged']} acknowledged, {commands['timeouts']} timed out, "
+              f"RTT p50 {commands['rtt_p50_ms']:.1f} ms", file=sys.stderr)
+
+    if not args.skip_bus:
+        with tempfile.TemporaryDirectory() as workdir:
+            results["bus"] = bench_bus(workdir=workdir)
+        fanout = results["bus"]
+        print(f"bus: {fanout['received']}/{fanout['samples']} samples to the live subscriber, "
+              f"latency p50 {fanout['latency_p50_ms']:.1f} ms, publish max {fanout['publish_max_ms']:.1f} ms, "
+              f"{fanout['stalled_dropped']} events dropped for the stalled one", file=sys.stderr)
+
+    text = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()